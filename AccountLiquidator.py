@@ -1,47 +1,59 @@
-import abc
+import asyncio
 import datetime
 import logging
 import typing
 
-from solana.transaction import Transaction
+from pyserum.market.orderbook import OrderBook
+from solana.publickey import PublicKey
+from solana.transaction import Transaction, TransactionInstruction
 
-from BaseModel import Group, LiquidationEvent, MarginAccount, MarginAccountMetadata, TokenValue
+from BaseModel import AccountInfo, Group, LiquidationEvent, MarginAccount, MarginAccountMetadata, TokenValue
+from Constants import SYSTEM_PROGRAM_ADDRESS
 from Context import Context
+from Decoder import decode_binary
 from Instructions import ForceCancelOrdersInstructionBuilder, InstructionBuilder, LiquidateInstructionBuilder
 from Observables import EventSource
 from Wallet import Wallet
 
-class AccountLiquidator(metaclass=abc.ABCMeta):
+# Solana packets are 1280 bytes, less 48 bytes of IPv6 and fragment headers.
+MAX_TRANSACTION_SIZE = 1232
+
+class AccountLiquidator:
+    logger: logging.Logger = logging.getLogger("AccountLiquidator")
+
+    # Each liquidator class gets its own logger, looked up once when the class is defined rather
+    # than every time one is constructed.
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.logger = logging.getLogger(cls.__name__)
+
     def __init__(self):
-        self.logger: logging.Logger = logging.getLogger(self.__class__.__name__)
+        pass
 
-    @abc.abstractmethod
-    def prepare_instructions(self, group: Group, margin_account: MarginAccount, prices: typing.List[TokenValue]) -> typing.List[InstructionBuilder]:
+    async def prepare_instructions(self, group: Group, margin_account: MarginAccount, prices: typing.List[TokenValue]) -> typing.List[InstructionBuilder]:
         raise NotImplementedError("AccountLiquidator.prepare_instructions() is not implemented on the base type.")
 
-    @abc.abstractmethod
-    def liquidate(self, group: Group, margin_account: MarginAccount, prices: typing.List[TokenValue]) -> typing.Optional[str]:
+    async def liquidate(self, group: Group, margin_account: MarginAccount, prices: typing.List[TokenValue]) -> typing.Optional[str]:
         raise NotImplementedError("AccountLiquidator.liquidate() is not implemented on the base type.")
 
 class NullAccountLiquidator(AccountLiquidator):
     def __init__(self):
         super().__init__()
 
-    def prepare_instructions(self, group: Group, margin_account: MarginAccount, prices: typing.List[TokenValue]) -> typing.List[InstructionBuilder]:
+    async def prepare_instructions(self, group: Group, margin_account: MarginAccount, prices: typing.List[TokenValue]) -> typing.List[InstructionBuilder]:
         return []
 
-    def liquidate(self, group: Group, margin_account: MarginAccount, prices: typing.List[TokenValue]) -> typing.Optional[str]:
+    async def liquidate(self, group: Group, margin_account: MarginAccount, prices: typing.List[TokenValue]) -> typing.Optional[str]:
         self.logger.info(f"Skipping liquidation of margin account [{margin_account.address}]")
         return None
 
 class ActualAccountLiquidator(AccountLiquidator):
     def __init__(self, context: Context, wallet: Wallet):
         super().__init__()
-        self.logger: logging.Logger = logging.getLogger(self.__class__.__name__)
         self.context = context
         self.wallet = wallet
 
-    def prepare_instructions(self, group: Group, margin_account: MarginAccount, prices: typing.List[TokenValue]) -> typing.List[InstructionBuilder]:
+    async def prepare_instructions(self, group: Group, margin_account: MarginAccount, prices: typing.List[TokenValue]) -> typing.List[InstructionBuilder]:
         liquidate_instructions: typing.List[InstructionBuilder] = []
         liquidate_instruction = LiquidateInstructionBuilder.from_margin_account_and_market(self.context, group, self.wallet, margin_account, prices)
         if liquidate_instruction is not None:
@@ -49,85 +61,158 @@ class ActualAccountLiquidator(AccountLiquidator):
 
         return liquidate_instructions
 
-    def liquidate(self, group: Group, margin_account: MarginAccount, prices: typing.List[TokenValue]) -> typing.Optional[str]:
-        instruction_builders = self.prepare_instructions(group, margin_account, prices)
+    async def liquidate(self, group: Group, margin_account: MarginAccount, prices: typing.List[TokenValue]) -> typing.Optional[str]:
+        instruction_builders = await self.prepare_instructions(group, margin_account, prices)
 
         if len(instruction_builders) == 0:
             return None
 
-        transaction = Transaction()
+        # Pack as many instructions as will fit into each transaction. Usually that's all of them,
+        # but a margin account with lots of orders to cancel can spill over into more than one.
+        transactions: typing.List[Transaction] = [Transaction()]
         for builder in instruction_builders:
-            transaction.add(builder.build())
+            instruction = builder.build()
+            candidate = transactions[-1].instructions + [instruction]
+            if len(transactions[-1].instructions) > 0 and ActualAccountLiquidator._estimate_transaction_size(self.wallet.address, candidate) > MAX_TRANSACTION_SIZE:
+                transactions += [Transaction()]
+            transactions[-1].add(instruction)
+
+        transaction_id: typing.Optional[str] = None
+        for index, transaction in enumerate(transactions):
+            # Formatting all the keys is expensive, so only do it if someone's going to see it.
+            if self.logger.isEnabledFor(logging.DEBUG):
+                for instruction in transaction.instructions:
+                    self.logger.debug("INSTRUCTION")
+                    self.logger.debug("    Keys:")
+                    for key in instruction.keys:
+                        self.logger.debug(f"        {str(key.pubkey):<45} {str(key.is_signer):<6} {str(key.is_writable):<6}")
+                    data = " ".join(f"{x:02x}" for x in instruction.data)
+                    self.logger.debug(f"    Data: {data}")
+                    self.logger.debug(f"    Program ID: {instruction.program_id}")
+
+            # Later transactions depend on the earlier ones (the liquidation itself always comes
+            # last) so each spilled-over transaction has to land before the next is sent.
+            if transaction_id is not None and not await self.context.wait_for_confirmation_async(transaction_id):
+                raise Exception(f"Transaction {index} of {len(transactions)} ({transaction_id}) was not confirmed - not sending the remaining {len(transactions) - index} transaction(s).")
+
+            transaction_response = await self.context.async_client.send_transaction(transaction, self.wallet.account)
+            transaction_id = self.context.unwrap_transaction_id_or_raise_exception(transaction_response)
+            if len(transactions) > 1:
+                self.logger.info(f"Sent transaction {index + 1} of {len(transactions)}: {transaction_id}")
+
+        return transaction_id
 
-        for instruction in transaction.instructions:
-            self.logger.debug("INSTRUCTION")
-            self.logger.debug("    Keys:")
+    @staticmethod
+    def _estimate_transaction_size(fee_payer: PublicKey, instructions: typing.List[TransactionInstruction]) -> int:
+        def compact_length(value: int) -> int:
+            return 1 if value < 0x80 else 2 if value < 0x4000 else 3
+
+        accounts = {str(fee_payer)}
+        signers = {str(fee_payer)}
+        instructions_size = 0
+        for instruction in instructions:
+            accounts.add(str(instruction.program_id))
             for key in instruction.keys:
-                self.logger.debug("        ", f"{key.pubkey}".ljust(45), f"{key.is_signer}".ljust(6), f"{key.is_writable}".ljust(6))
-            self.logger.debug("    Data:", " ".join(f"{x:02x}" for x in instruction.data))
-            self.logger.debug("    Program ID:", instruction.program_id)
+                accounts.add(str(key.pubkey))
+                if key.is_signer:
+                    signers.add(str(key.pubkey))
+            instructions_size += 1 + compact_length(len(instruction.keys)) + len(instruction.keys) + \
+                compact_length(len(instruction.data)) + len(instruction.data)
 
-        transaction_response = self.context.client.send_transaction(transaction, self.wallet.account)
-        transaction_id = self.context.unwrap_transaction_id_or_raise_exception(transaction_response)
-        return transaction_id
+        signatures_size = compact_length(len(signers)) + 64 * len(signers)
+        message_size = 3 + compact_length(len(accounts)) + 32 * len(accounts) + 32 + \
+            compact_length(len(instructions)) + instructions_size
+        return signatures_size + message_size
 
 class ForceCancelOrdersAccountLiquidator(ActualAccountLiquidator):
     def __init__(self, context: Context, wallet: Wallet):
         super().__init__(context, wallet)
 
-    def prepare_instructions(self, group: Group, margin_account: MarginAccount, prices: typing.List[TokenValue]) -> typing.List[InstructionBuilder]:
+    async def prepare_instructions(self, group: Group, margin_account: MarginAccount, prices: typing.List[TokenValue]) -> typing.List[InstructionBuilder]:
+        # Markets are cached on their MarketMetadata, and preload_markets_async() fills that cache
+        # for every market in the group with one request, so fetch_market() is normally free here.
+        # The bids and asks for every market are then fetched in a single JSON-RPC batch and the
+        # orderbooks parsed locally. Both requests are awaited rather than blocking, so preparing
+        # several margin accounts with asyncio.gather() overlaps their round-trips.
+        markets_with_open_orders = [(market_metadata, open_orders) for market_metadata, open_orders
+                                    in zip(group.markets, margin_account.open_orders_accounts)
+                                    if open_orders is not None]
+        await group.preload_markets_async()
+        markets = await asyncio.gather(*[market_metadata.fetch_market(self.context) for market_metadata, _ in markets_with_open_orders])
+
+        calls: typing.List[typing.Tuple[str, typing.List]] = []
+        for market in markets:
+            calls.extend([("getAccountInfo", [str(market.state.bids()), {"encoding": "base64"}]),
+                          ("getAccountInfo", [str(market.state.asks()), {"encoding": "base64"}])])
+        responses = await self.context.batch_request_async(calls)
+
         force_cancel_orders_instructions: typing.List[InstructionBuilder] = []
-        for index, market_metadata in enumerate(group.markets):
-            open_orders = margin_account.open_orders_accounts[index]
-            if open_orders is not None:
-                market = market_metadata.fetch_market(self.context)
-                orders = market.load_orders_for_owner(margin_account.owner)
-                order_count = len(orders)
-                if order_count > 0:
-                    force_cancel_orders_instructions += ForceCancelOrdersInstructionBuilder.multiple_instructions_from_margin_account_and_market(self.context, group, self.wallet, margin_account, market_metadata, order_count)
+        for index, (market_metadata, open_orders) in enumerate(markets_with_open_orders):
+            market = markets[index]
+            order_count = 0
+            for response in responses[index * 2:index * 2 + 2]:
+                result = self.context.unwrap_or_raise_exception(response)
+                orderbook = OrderBook.from_bytes(market.state, decode_binary(result["value"]["data"]))
+                order_count += sum(1 for order in orderbook.orders() if order.open_order_address == open_orders.address)
+            if order_count > 0:
+                force_cancel_orders_instructions.extend(ForceCancelOrdersInstructionBuilder.multiple_instructions_from_margin_account_and_market(self.context, group, self.wallet, margin_account, market_metadata, order_count))
 
-        all_instructions = force_cancel_orders_instructions + super().prepare_instructions(group, margin_account, prices)
+        force_cancel_orders_instructions.extend(await super().prepare_instructions(group, margin_account, prices))
 
-        return all_instructions
+        return force_cancel_orders_instructions
 
 class ReportingAccountLiquidator(AccountLiquidator):
     def __init__(self, inner: AccountLiquidator, context: Context, wallet: Wallet, liquidations_publisher: EventSource[LiquidationEvent]):
         super().__init__()
-        self.logger: logging.Logger = logging.getLogger(self.__class__.__name__)
         self.inner: AccountLiquidator = inner
         self.context: Context = context
         self.wallet: Wallet = wallet
         self.liquidations_publisher: EventSource[LiquidationEvent] = liquidations_publisher
 
-    def prepare_instructions(self, group: Group, margin_account: MarginAccount, prices: typing.List[TokenValue]) -> typing.List[InstructionBuilder]:
-        return self.inner.prepare_instructions(group, margin_account, prices)
+    async def prepare_instructions(self, group: Group, margin_account: MarginAccount, prices: typing.List[TokenValue]) -> typing.List[InstructionBuilder]:
+        return await self.inner.prepare_instructions(group, margin_account, prices)
 
-    def liquidate(self, group: Group, margin_account: MarginAccount, prices: typing.List[TokenValue]) -> typing.Optional[str]:
+    async def liquidate(self, group: Group, margin_account: MarginAccount, prices: typing.List[TokenValue]) -> typing.Optional[str]:
         balance_sheet = margin_account.get_balance_sheet_totals(group, prices)
         balances = margin_account.get_intrinsic_balances(group)
         mam = MarginAccountMetadata(margin_account, balance_sheet, balances)
 
-        balances_before = group.fetch_balances(self.wallet.address)
+        # fetch_balances() is blocking, so keep it off the event loop.
+        loop = asyncio.get_running_loop()
+        balances_before = await loop.run_in_executor(None, group.fetch_balances, self.wallet.address)
         self.logger.info("Wallet balances before:")
         TokenValue.report(self.logger.info, balances_before)
 
         self.logger.info(f"Margin account balances before:\n{mam.balances}")
         self.logger.info(f"Liquidating margin account: {mam.margin_account}\n{mam.balance_sheet}")
-        transaction_id = self.inner.liquidate(group, mam.margin_account, prices)
+        transaction_id = await self.inner.liquidate(group, mam.margin_account, prices)
         if transaction_id is None:
             self.logger.info("No transaction sent.")
         else:
             self.logger.info(f"Transaction ID: {transaction_id} - waiting for confirmation...")
 
-            self.context.wait_for_confirmation(transaction_id)
-
-            group_after = Group.load(self.context)
-            margin_account_after_liquidation = MarginAccount.load(self.context, mam.margin_account.address, group_after)
+            await self.context.wait_for_confirmation_async(transaction_id)
+
+            # The group, the margin account and its open orders accounts all need reloading now, so
+            # fetch them together in one call.
+            Group.invalidate_cache(self.context)
+            open_orders_addresses = [address for address in mam.margin_account.open_orders if address != SYSTEM_PROGRAM_ADDRESS]
+            addresses = [self.context.group_id, mam.margin_account.address] + open_orders_addresses
+            account_infos: typing.List[AccountInfo] = []
+            for address, value in zip(addresses, await self.context.get_multiple_accounts_async(addresses)):
+                if value is None:
+                    raise Exception(f"Account not found at address '{address}'")
+                account_infos.append(AccountInfo._from_response_values(value, address))
+
+            group_after = Group.parse(self.context, account_infos[0])
+            margin_account_after_liquidation = MarginAccount.parse(account_infos[1])
+            open_orders_by_address = {bytes(account_info.address): account_info for account_info in account_infos[2:]}
+            margin_account_after_liquidation.install_open_orders_accounts(group_after, open_orders_by_address)
             intrinsic_balances_after = margin_account_after_liquidation.get_intrinsic_balances(group_after)
             self.logger.info(f"Margin account balances after: {intrinsic_balances_after}")
 
             self.logger.info("Wallet Balances After:")
-            balances_after = group_after.fetch_balances(self.wallet.address)
+            balances_after = await loop.run_in_executor(None, group_after.fetch_balances, self.wallet.address)
             TokenValue.report(self.logger.info, balances_after)
 
             liquidation_event = LiquidationEvent(datetime.datetime.now(),
@@ -138,8 +223,7 @@ class ReportingAccountLiquidator(AccountLiquidator):
                                                  balances_after)
 
             self.logger.info("Wallet Balances Changes:")
-            changes = TokenValue.changes(balances_before, balances_after)
-            TokenValue.report(self.logger.info, changes)
+            TokenValue.report(self.logger.info, liquidation_event.changes)
 
             self.liquidations_publisher.publish(liquidation_event)
 
@@ -149,19 +233,24 @@ if __name__ == "__main__":
     logging.getLogger().setLevel(logging.INFO)
 
     from Context import default_context
-    from Wallet import default_wallet
+    from Wallet import get_default_wallet
 
+    default_wallet = get_default_wallet()
     if default_wallet is None:
         print("No default wallet file available.")
     else:
         group = Group.load(default_context)
         prices = group.fetch_token_prices()
         margin_accounts = MarginAccount.load_all_for_owner(default_context, default_wallet.address, group)
-        for margin_account in margin_accounts:
-            account_liquidator = ActualAccountLiquidator(default_context, default_wallet)
-            print(account_liquidator.prepare_instructions(group, margin_account, prices))
+        account_liquidator = ActualAccountLiquidator(default_context, default_wallet)
+        force_cancel_orders_account_liquidator = ForceCancelOrdersAccountLiquidator(default_context, default_wallet)
+
+        async def _prepare_all():
+            return await asyncio.gather(*[liquidator.prepare_instructions(group, margin_account, prices)
+                                          for margin_account in margin_accounts
+                                          for liquidator in [account_liquidator, force_cancel_orders_account_liquidator]])
 
-            force_cancel_orders_account_liquidator = ForceCancelOrdersAccountLiquidator(default_context, default_wallet)
-            print(force_cancel_orders_account_liquidator.prepare_instructions(group, margin_account, prices))
+        for instructions in asyncio.run(_prepare_all()):
+            print(instructions)
 
 
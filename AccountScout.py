@@ -1,3 +1,4 @@
+import io
 import logging
 import typing
 
@@ -15,6 +16,7 @@ class ScoutReport:
         self.errors: typing.List[str] = []
         self.warnings: typing.List[str] = []
         self.details: typing.List[str] = []
+        self._text: typing.Optional[str] = None
 
     @property
     def has_errors(self) -> bool:
@@ -26,19 +28,34 @@ class ScoutReport:
 
     def add_error(self, error) -> None:
         self.errors += [error]
+        self._text = None
 
     def add_warning(self, warning) -> None:
         self.warnings += [warning]
+        self._text = None
 
     def add_detail(self, detail) -> None:
         self.details += [detail]
+        self._text = None
 
     def __str__(self) -> str:
+        # Reports can be logged many times over, so the text is only built again if something
+        # has been added since the last time.
+        if self._text is None:
+            self._text = self._build_text()
+        return self._text
+
+    def _build_text(self) -> str:
         def _pad(text_list: typing.List[str]) -> str:
             if len(text_list) == 0:
                 return "None"
             padding = "\n        "
-            return padding.join(map(lambda text: text.replace("\n", padding), text_list))
+            output = io.StringIO()
+            for index, text in enumerate(text_list):
+                if index > 0:
+                    output.write(padding)
+                output.write(text.replace("\n", padding))
+            return output.getvalue()
 
         error_text = _pad(self.errors)
         warning_text = _pad(self.warnings)
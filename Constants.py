@@ -8,12 +8,32 @@ SYSTEM_PROGRAM_ADDRESS = PublicKey("11111111111111111111111111111111")
 
 SOL_DECIMALS = decimal.Decimal(9)
 
-SOL_DECIMAL_DIVISOR = decimal.Decimal(10 ** SOL_DECIMALS)
+SOL_DECIMAL_DIVISOR = 10 ** 9
+
+# Shared Decimal constants, so hot paths don't build a new Decimal(0) or Decimal(1) every time.
+ZERO = decimal.Decimal(0)
+
+ONE = decimal.Decimal(1)
+
+Lamports = int
 
 NUM_TOKENS = 3
 
 NUM_MARKETS = NUM_TOKENS - 1
 
+# Interest rate model parameters. Rates are plain floats - they're only ever used for the rate
+# calculations, which don't need Decimal precision.
+MAX_RATE = 1.5
+
+OPTIMAL_RATE = 0.06
+
+OPTIMAL_UTIL = 0.7
+
+# The slopes of the rate curve above and below optimal utilisation.
+RATE_SLOPE_HIGH = (MAX_RATE - OPTIMAL_RATE) / (1 - OPTIMAL_UTIL)
+
+RATE_SLOPE_LOW = OPTIMAL_RATE / OPTIMAL_UTIL
+
 WARNING_DISCLAIMER_TEXT = """
 ⚠ WARNING ⚠
 
@@ -27,8 +47,15 @@ THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLI
     📧 Email: mailto:hello@blockworks.foundation
 """
 
-with open("ids.json") as json_file:
-    MangoConstants = json.load(json_file)
+# orjson parses ids.json several times faster than the standard library, but it's optional.
+try:
+    import orjson
+
+    with open("ids.json", "rb") as json_file:
+        MangoConstants = orjson.loads(json_file.read())
+except ImportError:
+    with open("ids.json") as json_file:
+        MangoConstants = json.load(json_file)
 
 if __name__ == "__main__":
     logging.getLogger().setLevel(logging.INFO)
@@ -1,16 +1,103 @@
+import asyncio
+import base64
+import functools
+import httpx
+import itertools
+import json
 import logging
 import os
-import random
+import requests
+import requests.adapters
+import secrets
 import time
 import typing
+import websockets
 
 from decimal import Decimal
+from solana.account import Account
 from solana.publickey import PublicKey
 from solana.rpc.api import Client
-from solana.rpc.types import MemcmpOpts, RPCError, RPCResponse
+from solana.rpc.async_api import AsyncClient
+from solana.rpc.types import MemcmpOpts, RPCError, RPCMethod, RPCResponse
 from solana.rpc.commitment import Commitment, Single
+from solana.rpc.providers.http import HTTPProvider
+from solana.transaction import Transaction
+
+from Constants import Lamports, MangoConstants, SOL_DECIMALS
+from Decoder import ZSTD_AVAILABLE
+
+# Decoding the JSON responses is most of the CPU cost of loading many accounts, and orjson does it
+# several times faster than the json module. It's optional - without it, json is used as before.
+try:
+    import orjson
+    _json_loads: typing.Callable[[typing.Union[bytes, str]], typing.Any] = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+# One keep-alive connection pool shared by every Context, so RPC calls reuse connections instead of
+# paying for a new TCP/TLS handshake each time.
+_SHARED_SESSION = requests.Session()
+_SHARED_SESSION.mount("https://", requests.adapters.HTTPAdapter(pool_connections=16, pool_maxsize=64))
+_SHARED_SESSION.mount("http://", requests.adapters.HTTPAdapter(pool_connections=16, pool_maxsize=64))
+_SHARED_SESSION.headers.update({"Content-Type": "application/json", "Accept-Encoding": "gzip, deflate"})
+
+# The most addresses a node accepts in a single getMultipleAccounts call.
+MAX_MULTIPLE_ACCOUNTS = 100
+
+class _SessionHTTPProvider(HTTPProvider):
+    def __init__(self, endpoint: str, session: requests.Session):
+        super().__init__(endpoint)
+        self.session: requests.Session = session
+        self._request_ids = itertools.count(1)
+
+    def make_request(self, method: RPCMethod, *params: typing.Any) -> RPCResponse:
+        request = {"jsonrpc": "2.0", "id": next(self._request_ids), "method": method, "params": params}
+        raw_response = self.session.post(self.endpoint_uri, data=json.dumps(request))
+        raw_response.raise_for_status()
+        return typing.cast(RPCResponse, _json_loads(raw_response.content))
+
+# PublicKey.__str__() base58-encodes the key every time, and the same few keys get looked up over
+# and over again.
+@functools.lru_cache(maxsize=1024)
+def _pk_b58(public_key: PublicKey) -> str:
+    return str(public_key)
+
+# Collects the account loads requested during one event loop tick and makes them all with a single
+# getMultipleAccounts batch, so callers that each load one account (oracles, vaults, markets)
+# don't pay a round-trip apiece. Each caller gets the raw account value (or None) for its address.
+class AccountLoader:
+    def __init__(self, context: "Context"):
+        self.context: "Context" = context
+        self._pending: typing.List[typing.Tuple[PublicKey, asyncio.Future]] = []
+        self._flush_task: typing.Optional[asyncio.Task] = None
+
+    def load(self, address: PublicKey) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        if len(self._pending) == 0:
+            loop.call_soon(self._start_flush, loop)
+        self._pending.append((address, future))
+        return future
+
+    def _start_flush(self, loop: asyncio.AbstractEventLoop) -> None:
+        pending, self._pending = self._pending, []
+        self._flush_task = loop.create_task(self._flush(pending))
+
+    async def _flush(self, pending: typing.List[typing.Tuple[PublicKey, asyncio.Future]]) -> None:
+        unique_addresses = list(dict.fromkeys(address for address, _ in pending))
+        try:
+            values = await self.context.get_multiple_accounts_async(unique_addresses)
+        except Exception as exception:
+            for _, future in pending:
+                if not future.done():
+                    future.set_exception(exception)
+            return
+
+        values_by_address = dict(zip(unique_addresses, values))
+        for address, future in pending:
+            if not future.done():
+                future.set_result(values_by_address[address])
 
-from Constants import MangoConstants, SOL_DECIMAL_DIVISOR
 
 class Context:
     def __init__(self, cluster: str, cluster_url: str, program_id: PublicKey, dex_program_id: PublicKey,
@@ -19,28 +106,151 @@ class Context:
         self.cluster: str = cluster
         self.cluster_url: str = cluster_url
         self.client: Client = Client(cluster_url)
+        self.client._provider = _SessionHTTPProvider(cluster_url, _SHARED_SESSION)
+        self.session: requests.Session = _SHARED_SESSION
+        self._async_client: typing.Optional[AsyncClient] = None
+        self._async_client_loop: typing.Optional[asyncio.AbstractEventLoop] = None
+        self._async_http_client: typing.Optional[httpx.AsyncClient] = None
+        self._async_http_client_loop: typing.Optional[asyncio.AbstractEventLoop] = None
+        self.account_loader: AccountLoader = AccountLoader(self)
+        self.websocket_url: str = Context._websocket_url_for(cluster_url)
         self.program_id: PublicKey = program_id
         self.dex_program_id: PublicKey = dex_program_id
         self.group_name: str = group_name
         self.group_id: PublicKey = group_id
         self.commitment: Commitment = Single
-        self.encoding: str = "base64"
+        self.encoding: str = "base64+zstd" if ZSTD_AVAILABLE else "base64"
+
+        # Reverse indexes so looking up a name from an address is a single dict lookup.
+        cluster_constants = MangoConstants[cluster]
+        self._group_name_by_address: typing.Dict[str, str] = {values["mango_group_pk"]: name for name, values in cluster_constants["mango_groups"].items()}
+        self._market_name_by_address: typing.Dict[str, str] = {address: name for name, address in cluster_constants["spot_markets"].items()}
+        self._oracle_name_by_address: typing.Dict[str, str] = {address: name for name, address in cluster_constants["oracles"].items()}
+        self._token_name_by_address: typing.Dict[str, str] = {address: name for name, address in cluster_constants["symbols"].items()}
+        self._token_address_by_name: typing.Dict[str, PublicKey] = {name: PublicKey(address) for name, address in cluster_constants["symbols"].items()}
 
     def fetch_sol_balance(self, account_public_key: PublicKey) -> Decimal:
         result = self.client.get_balance(account_public_key, commitment=self.commitment)
-        value = Decimal(result["result"]["value"])
-        return value / SOL_DECIMAL_DIVISOR
+        lamports: Lamports = result["result"]["value"]
+        # The balance feeds into Decimal token arithmetic, so it stays a Decimal, but shifting the
+        # exponent is exact and much cheaper than a Decimal division.
+        return Decimal(lamports).scaleb(-SOL_DECIMALS)
 
     def fetch_program_accounts_for_owner(self, program_id: PublicKey, owner: PublicKey):
         memcmp_opts = [
-            MemcmpOpts(offset=40, bytes=str(owner)),
+            MemcmpOpts(offset=40, bytes=_pk_b58(owner)),
         ]
 
         return self.client.get_program_accounts(program_id, memcmp_opts=memcmp_opts, commitment=self.commitment, encoding=self.encoding)
 
+    def batch_request(self, calls: typing.List[typing.Tuple[str, typing.List]]) -> typing.List[RPCResponse]:
+        # Sends all the calls as a single JSON-RPC batch - one HTTP round-trip instead of one per
+        # call. Responses are returned in the same order as the calls, whatever order the server
+        # chooses to send them back in.
+        if len(calls) == 0:
+            return []
+
+        payload = [{"jsonrpc": "2.0", "id": index, "method": method, "params": params}
+                   for index, (method, params) in enumerate(calls)]
+        response = self.session.post(self.cluster_url, data=json.dumps(payload))
+        response.raise_for_status()
+        return self._ordered_batch_results(_json_loads(response.content))
+
+    def _ordered_batch_results(self, results: typing.Any) -> typing.List[RPCResponse]:
+        # A node that rejects the batch as a whole (rate limiting, an invalid request) replies with
+        # a single error object rather than a list, so raise that error instead of trying to sort it.
+        if isinstance(results, dict):
+            self.unwrap_or_raise_exception(results)
+            raise Exception(f"Expected a list of responses to JSON-RPC batch request, got: {results}")
+        return sorted(results, key=lambda result: result["id"])
+
+    def send_multiple_transactions(self, transactions: typing.List[Transaction], *signers: Account) -> typing.List[RPCResponse]:
+        # Signs all the transactions against one recent blockhash and sends them as a single
+        # JSON-RPC batch. The raw responses come back in the same order as the transactions, so
+        # callers can unwrap each one separately and one failure doesn't hide the others.
+        if len(transactions) == 0:
+            return []
+
+        blockhash_response = self.client.get_recent_blockhash(self.commitment)
+        recent_blockhash = self.unwrap_or_raise_exception(blockhash_response)["value"]["blockhash"]
+        calls: typing.List[typing.Tuple[str, typing.List]] = []
+        for transaction in transactions:
+            transaction.recent_blockhash = recent_blockhash
+            transaction.sign(*signers)
+            encoded = base64.b64encode(transaction.serialize()).decode("ascii")
+            calls.append(("sendTransaction", [encoded, {"encoding": "base64", "preflightCommitment": self.commitment}]))
+
+        return self.batch_request(calls)
+
+    def get_multiple_accounts(self, addresses: typing.List[PublicKey]) -> typing.List[typing.Optional[typing.Dict[str, typing.Any]]]:
+        # Returns the raw account values (or None for missing accounts) in the same order as the
+        # addresses. getMultipleAccounts takes at most MAX_MULTIPLE_ACCOUNTS addresses, so longer
+        # lists are split into chunks that all go in a single JSON-RPC batch.
+        address_strings = [_pk_b58(address) for address in addresses]
+        options = {"encoding": self.encoding, "commitment": self.commitment}
+        chunks = [address_strings[start:start + MAX_MULTIPLE_ACCOUNTS] for start in range(0, len(address_strings), MAX_MULTIPLE_ACCOUNTS)]
+        if len(chunks) <= 1:
+            response = self.client._provider.make_request(RPCMethod("getMultipleAccounts"), address_strings, options)
+            return self.unwrap_or_raise_exception(response)["value"]
+
+        values: typing.List[typing.Optional[typing.Dict[str, typing.Any]]] = []
+        for response in self.batch_request([("getMultipleAccounts", [chunk, options]) for chunk in chunks]):
+            values += self.unwrap_or_raise_exception(response)["value"]
+        return values
+
+    # Like the httpx client below, an AsyncClient's pooled connections belong to the event loop that
+    # opened them, so each loop gets its own rather than one shared for the lifetime of the Context.
+    @property
+    def async_client(self) -> AsyncClient:
+        loop = asyncio.get_running_loop()
+        if self._async_client is None or self._async_client_loop is not loop:
+            self._async_client = AsyncClient(self.cluster_url)
+            self._async_client_loop = loop
+        return self._async_client
+
+    def _get_async_http_client(self) -> httpx.AsyncClient:
+        # An httpx.AsyncClient's connections belong to the event loop they were opened on, and
+        # callers here often use a fresh asyncio.run() loop each time, so there's one client per
+        # loop rather than one for the lifetime of the Context.
+        loop = asyncio.get_running_loop()
+        if self._async_http_client is None or self._async_http_client_loop is not loop:
+            self._async_http_client = httpx.AsyncClient(headers={"Content-Type": "application/json"})
+            self._async_http_client_loop = loop
+        return self._async_http_client
+
+    async def get_multiple_accounts_async(self, addresses: typing.List[PublicKey]) -> typing.List[typing.Optional[typing.Dict[str, typing.Any]]]:
+        # The same as get_multiple_accounts(), but without blocking the event loop while it waits
+        # for the node. All the chunks go in a single JSON-RPC batch.
+        if len(addresses) == 0:
+            return []
+
+        address_strings = [_pk_b58(address) for address in addresses]
+        options = {"encoding": self.encoding, "commitment": self.commitment}
+        payload = [{"jsonrpc": "2.0", "id": index, "method": "getMultipleAccounts", "params": [address_strings[start:start + MAX_MULTIPLE_ACCOUNTS], options]}
+                   for index, start in enumerate(range(0, len(address_strings), MAX_MULTIPLE_ACCOUNTS))]
+        response = await self._get_async_http_client().post(self.cluster_url, content=json.dumps(payload))
+        response.raise_for_status()
+
+        values: typing.List[typing.Optional[typing.Dict[str, typing.Any]]] = []
+        for result in self._ordered_batch_results(_json_loads(response.content)):
+            values += self.unwrap_or_raise_exception(result)["value"]
+        return values
+
+    async def batch_request_async(self, calls: typing.List[typing.Tuple[str, typing.List]]) -> typing.List[RPCResponse]:
+        # The same as batch_request(), but without blocking the event loop while it waits for the
+        # node.
+        if len(calls) == 0:
+            return []
+
+        payload = [{"jsonrpc": "2.0", "id": index, "method": method, "params": params}
+                   for index, (method, params) in enumerate(calls)]
+        response = await self._get_async_http_client().post(self.cluster_url, content=json.dumps(payload))
+        response.raise_for_status()
+        return self._ordered_batch_results(_json_loads(response.content))
+
     def unwrap_or_raise_exception(self, response: RPCResponse) -> typing.Any:
         if "error" in response:
-            if response["error"] is str:
+            if isinstance(response["error"], str):
                 message: str = typing.cast(str, response["error"])
                 code: int = -1
             else:
@@ -56,52 +266,147 @@ class Context:
 
     def random_client_id(self) -> int:
         # 9223372036854775807 is sys.maxsize for 64-bit systems, with a bit_length of 63.
-        # We explicitly want to use a max of 64-bits though, so we use the number instead of
-        # sys.maxsize, which could be lower on 32-bit systems or higher on 128-bit systems.
-        return random.randrange(9223372036854775807)
-
-    @staticmethod
-    def _lookup_name_by_address(address: PublicKey, collection: typing.Dict[str, str]) -> typing.Optional[str]:
-        address_string = str(address)
-        for stored_name, stored_address in collection.items():
-            if stored_address == address_string:
-                return stored_name
-        return None
-
-    @staticmethod
-    def _lookup_address_by_name(name: str, collection: typing.Dict[str, str]) -> typing.Optional[PublicKey]:
-        for stored_name, stored_address in collection.items():
-            if stored_name == name:
-                return PublicKey(stored_address)
-        return None
+        # We explicitly want to use a max of 64-bits though, so we ask for 63 random bits instead
+        # of relying on sys.maxsize, which could be lower on 32-bit systems or higher on 128-bit
+        # systems. secrets uses the OS source directly, so there's no shared generator state to
+        # contend on when liquidations run concurrently.
+        return secrets.randbits(63)
 
     def lookup_group_name(self, group_address: PublicKey) -> str:
-        for name, values in MangoConstants[self.cluster]["mango_groups"].items():
-            if values["mango_group_pk"] == str(group_address):
-                return name
-        return "« Unknown Group »"
+        return self._group_name_by_address.get(_pk_b58(group_address), "« Unknown Group »")
 
     def lookup_market_name(self, market_address: PublicKey) -> str:
-        return Context._lookup_name_by_address(market_address, MangoConstants[self.cluster]["spot_markets"]) or "« Unknown Market »"
+        return self._market_name_by_address.get(_pk_b58(market_address), "« Unknown Market »")
 
     def lookup_oracle_name(self, token_address: PublicKey) -> str:
-        return Context._lookup_name_by_address(token_address, MangoConstants[self.cluster]["oracles"]) or "« Unknown Oracle »"
+        return self._oracle_name_by_address.get(_pk_b58(token_address), "« Unknown Oracle »")
 
     def lookup_token_name(self, token_address: PublicKey) -> typing.Optional[str]:
-        return Context._lookup_name_by_address(token_address, MangoConstants[self.cluster]["symbols"])
+        return self._token_name_by_address.get(_pk_b58(token_address))
 
     def lookup_token_address(self, token_name: str) -> typing.Optional[PublicKey]:
-        return Context._lookup_address_by_name(token_name, MangoConstants[self.cluster]["symbols"])
+        return self._token_address_by_name.get(token_name)
 
-    def wait_for_confirmation(self, transaction_id: str, max_wait_in_seconds: int = 60) -> None:
+    @staticmethod
+    def _websocket_url_for(cluster_url: str) -> str:
+        if cluster_url.startswith("https://"):
+            return "wss://" + cluster_url[len("https://"):]
+        elif cluster_url.startswith("http://"):
+            return "ws://" + cluster_url[len("http://"):]
+        return cluster_url
+
+    async def _subscribe_for_confirmation(self, transaction_id: str) -> bool:
+        # Returns whether the transaction succeeded once the node reports it confirmed. Raises if
+        # the node rejects the subscription or the stream ends first, so the caller can fall back
+        # to polling rather than mistaking either for a confirmation.
+        async with websockets.connect(self.websocket_url) as websocket:
+            request = {"jsonrpc": "2.0", "id": 1, "method": "signatureSubscribe",
+                       "params": [transaction_id, {"commitment": "confirmed"}]}
+            await websocket.send(json.dumps(request))
+            async for message in websocket:
+                notification = _json_loads(message)
+                if notification.get("id") == 1:
+                    self.unwrap_or_raise_exception(notification)
+                elif notification.get("method") == "signatureNotification":
+                    error = notification["params"]["result"]["value"]["err"]
+                    if error is not None:
+                        self.logger.error(f"Transaction {transaction_id} failed: {error}")
+                    return error is None
+        raise ConnectionError(f"Confirmation subscription for {transaction_id} closed before the transaction was confirmed.")
+
+    async def subscribe_account(self, address: PublicKey, callback: typing.Callable[[bytes], bool], subscribed: typing.Optional[asyncio.Event] = None) -> None:
+        # Calls the callback with the account's new data every time the account changes, until the
+        # callback returns True. Each update is different, so the data is decoded directly rather
+        # than through the Decoder caches. If given, the subscribed event is set once the node has
+        # confirmed the subscription, so callers know no later change can be missed. Returning
+        # always means the callback returned True - if the stream ends first, this raises.
+        async with websockets.connect(self.websocket_url) as websocket:
+            request = {"jsonrpc": "2.0", "id": 1, "method": "accountSubscribe",
+                       "params": [_pk_b58(address), {"encoding": "base64", "commitment": self.commitment}]}
+            await websocket.send(json.dumps(request))
+            async for message in websocket:
+                notification = _json_loads(message)
+                if notification.get("id") == 1:
+                    self.unwrap_or_raise_exception(notification)
+                    if subscribed is not None:
+                        subscribed.set()
+                elif notification.get("method") == "accountNotification":
+                    data = base64.b64decode(notification["params"]["result"]["value"]["data"][0])
+                    if callback(data):
+                        return
+        raise ConnectionError(f"Subscription to account {address} closed.")
+
+    async def wait_for_confirmation_async(self, transaction_id: str, max_wait_in_seconds: int = 60) -> bool:
         self.logger.info(f"Waiting up to {max_wait_in_seconds} seconds for {transaction_id}.")
+        started_at = time.time()
+        try:
+            succeeded = await asyncio.wait_for(self._subscribe_for_confirmation(transaction_id), timeout=max_wait_in_seconds)
+            if succeeded:
+                self.logger.info(f"Confirmed after {time.time() - started_at:.2f} seconds.")
+            return succeeded
+        except asyncio.TimeoutError:
+            self.logger.info(f"Timed out after {max_wait_in_seconds} seconds waiting on transaction {transaction_id}.")
+            return False
+        except Exception as exception:
+            self.logger.warning(f"Could not subscribe to confirmation of {transaction_id} - falling back to polling: {exception}")
+
+        remaining = max(max_wait_in_seconds - int(time.time() - started_at), 0)
+        return await asyncio.get_event_loop().run_in_executor(None, self._poll_for_confirmation, transaction_id, remaining)
+
+    def _poll_for_confirmation(self, transaction_id: str, max_wait_in_seconds: int) -> bool:
         for wait in range(0, max_wait_in_seconds):
             time.sleep(1)
-            confirmed = default_context.client.get_confirmed_transaction(transaction_id)
+            confirmed = self.client.get_confirmed_transaction(transaction_id)
             if confirmed["result"] is not None:
+                error = confirmed["result"]["meta"]["err"]
+                if error is not None:
+                    self.logger.error(f"Transaction {transaction_id} failed: {error}")
+                    return False
                 self.logger.info(f"Confirmed after {wait} seconds.")
-                return
-        self.logger.info(f"Timed out after {wait} seconds waiting on transaction {transaction_id}.")
+                return True
+        self.logger.info(f"Timed out after {max_wait_in_seconds} seconds waiting on transaction {transaction_id}.")
+        return False
+
+    def wait_for_confirmation(self, transaction_id: str, max_wait_in_seconds: int = 60) -> bool:
+        return asyncio.run(self.wait_for_confirmation_async(transaction_id, max_wait_in_seconds))
+
+    def confirm_multiple_transactions(self, transaction_ids: typing.List[str], commitment: str = "confirmed", max_wait_in_seconds: int = 60) -> typing.Dict[str, bool]:
+        # Polls the status of all the transactions at once with getSignatureStatuses, backing off
+        # between polls, until every one has reached the commitment level, failed, or timed out.
+        # Returns whether each transaction was successfully confirmed.
+        commitment_levels = ["processed", "confirmed", "finalized"]
+        target_level = commitment_levels.index(commitment)
+        results: typing.Dict[str, bool] = {}
+        pending = list(transaction_ids)
+        started_at = time.time()
+        delay = 0.5
+        while len(pending) > 0 and time.time() - started_at < max_wait_in_seconds:
+            time.sleep(delay)
+            delay = min(delay * 2, 4)
+            response = self.client._provider.make_request(RPCMethod("getSignatureStatuses"), pending)
+            statuses = self.unwrap_or_raise_exception(response)["value"]
+            still_pending: typing.List[str] = []
+            for transaction_id, status in zip(pending, statuses):
+                if status is None:
+                    still_pending.append(transaction_id)
+                elif status["err"] is not None:
+                    self.logger.error(f"Transaction {transaction_id} failed: {status['err']}")
+                    results[transaction_id] = False
+                elif status.get("confirmationStatus") is None:
+                    # The node doesn't know the confirmation level yet - treat it as not yet confirmed.
+                    still_pending.append(transaction_id)
+                elif commitment_levels.index(status["confirmationStatus"]) >= target_level:
+                    self.logger.info(f"Transaction {transaction_id} confirmed after {time.time() - started_at:.2f} seconds.")
+                    results[transaction_id] = True
+                else:
+                    still_pending.append(transaction_id)
+            pending = still_pending
+
+        for transaction_id in pending:
+            self.logger.info(f"Timed out after {max_wait_in_seconds} seconds waiting on transaction {transaction_id}.")
+            results[transaction_id] = False
+
+        return results
 
     def __str__(self) -> str:
         return f"""« Context:
@@ -1,18 +1,51 @@
 import base64
 import base58
+import functools
 import logging
 import typing
 
 from solana.publickey import PublicKey
 
+# zstd-compressed account data ("base64+zstd" encoding) is much smaller over the wire, but it
+# needs the optional zstandard package to decode.
+try:
+    import zstandard
+    _zstd_decompressor = zstandard.ZstdDecompressor()
+except ImportError:
+    zstandard = None
+    _zstd_decompressor = None
+
+ZSTD_AVAILABLE: bool = zstandard is not None
+
+
+# The same accounts get fetched again and again (polling, before-and-after reports), so it's
+# worth remembering what their encoded data decoded to. base58 in particular is slow.
+@functools.lru_cache(maxsize=4096)
+def _b58(encoded: str) -> bytes:
+    return base58.b58decode(encoded)
+
+@functools.lru_cache(maxsize=4096)
+def _b64(encoded: str) -> bytes:
+    return base64.b64decode(encoded)
+
+@functools.lru_cache(maxsize=4096)
+def _b64_zstd(encoded: str) -> bytes:
+    if _zstd_decompressor is None:
+        raise Exception("Data is zstd-compressed but the zstandard package is not installed.")
+    return _zstd_decompressor.decompressobj().decompress(base64.b64decode(encoded))
+
+# Decoders by the encoding name the node sends alongside the data. Anything not listed here is
+# treated as base58, as before.
+_DECODERS: typing.Dict[str, typing.Callable[[str], bytes]] = {
+    "base64": _b64,
+    "base64+zstd": _b64_zstd,
+    "base58": _b58
+}
 
 def decode_binary(encoded: typing.List) -> bytes:
     if isinstance(encoded, str):
-        return base58.b58decode(encoded)
-    elif encoded[1] == "base64":
-        return base64.b64decode(encoded[0])
-    else:
-        return base58.b58decode(encoded[0])
+        return _b58(encoded)
+    return _DECODERS.get(encoded[1], _b58)(encoded[0])
 
 def encode_binary(decoded: bytes) -> typing.List:
     return [base64.b64encode(decoded), "base64"]
@@ -1,17 +1,47 @@
 import construct
 import datetime
+import struct
+import typing
 
 from decimal import Decimal
 from solana.publickey import PublicKey
 
 from Constants import NUM_MARKETS, NUM_TOKENS
 
+# A little-endian unsigned integer of a fixed number of bytes. It does the same job as
+# construct.BytesInteger(size, swapped=True) but converts with a single int.from_bytes() call
+# instead of going through construct's generic byte-swapping path.
+class FastLEInt(construct.Construct):
+    def __init__(self, size: int):
+        super().__init__()
+        self.size = size
+
+    def _parse(self, stream, context, path) -> int:
+        data = stream.read(self.size)
+        if len(data) != self.size:
+            raise construct.StreamError(f"stream read less than specified amount, expected {self.size}, found {len(data)}")
+        return int.from_bytes(data, "little")
+
+    def _build(self, obj, stream, context, path) -> int:
+        stream.write(int(obj).to_bytes(self.size, "little"))
+        return obj
+
+    def _sizeof(self, context, path) -> int:
+        return self.size
+
+    def _emitparse(self, code) -> str:
+        return f"int.from_bytes(io.read({self.size}), 'little')"
+
+
 class DecimalAdapter(construct.Adapter):
     def __init__(self, size: int = 8):
-        construct.Adapter.__init__(self, construct.BytesInteger(size, swapped=True))
+        construct.Adapter.__init__(self, FastLEInt(size))
 
-    def _decode(self, obj, context, path) -> Decimal:
-        return Decimal(obj)
+    # These are all whole numbers, so they're left as plain ints - building a Decimal for every
+    # field of every account is surprisingly expensive. Code that needs exact fractional
+    # arithmetic on them (dividing by decimals, for instance) converts to Decimal itself.
+    def _decode(self, obj, context, path) -> int:
+        return obj
 
     def _encode(self, obj, context, path) -> int:
         # Can only encode int values.
@@ -21,7 +51,7 @@ class DecimalAdapter(construct.Adapter):
 class FloatAdapter(construct.Adapter):
     def __init__(self, size: int = 16):
         self.size = size
-        construct.Adapter.__init__(self, construct.BytesInteger(size, swapped=True))
+        construct.Adapter.__init__(self, FastLEInt(size))
 
         # Our size is in bytes but we want to work with bits here.
         bit_size = self.size * 8
@@ -38,12 +68,27 @@ class FloatAdapter(construct.Adapter):
     def _encode(self, obj, context, path) -> bytes:
         return bytes(obj)
 
+# The same keys (mints, vaults, oracles, the group, program IDs) turn up in account after account,
+# so PublicKeys are cached by their raw bytes instead of being built again every time. The oldest
+# entries are dropped once the cache is full.
+_PUBLIC_KEY_CACHE_SIZE = 4096
+_public_key_cache: typing.Dict[bytes, PublicKey] = {}
+
+def _public_key_from_bytes(data: bytes) -> PublicKey:
+    public_key = _public_key_cache.get(data)
+    if public_key is None:
+        public_key = PublicKey(data)
+        if len(_public_key_cache) >= _PUBLIC_KEY_CACHE_SIZE:
+            del _public_key_cache[next(iter(_public_key_cache))]
+        _public_key_cache[data] = public_key
+    return public_key
+
 class PublicKeyAdapter(construct.Adapter):
     def __init__(self):
         construct.Adapter.__init__(self, construct.Bytes(32))
 
     def _decode(self, obj, context, path) -> PublicKey:
-        return PublicKey(obj)
+        return _public_key_from_bytes(obj)
 
     def _encode(self, obj, context, path) -> bytes:
         return bytes(obj)
@@ -51,7 +96,7 @@ class PublicKeyAdapter(construct.Adapter):
 
 class DatetimeAdapter(construct.Adapter):
     def __init__(self):
-        construct.Adapter.__init__(self, construct.BytesInteger(8, swapped=True))
+        construct.Adapter.__init__(self, FastLEInt(8))
 
     def _decode(self, obj, context, path) -> datetime.datetime:
         return datetime.datetime.fromtimestamp(obj)
@@ -59,6 +104,54 @@ class DatetimeAdapter(construct.Adapter):
     def _encode(self, obj, context, path) -> bytes:
         return bytes(obj)
 
+# An array of one of the fixed-size adapters above. construct.Array parses each element through the
+# full construct machinery; this reads the bytes for the whole array in one go, unpacks all the
+# integers with a single struct call where it can, and only then applies the adapter's _decode().
+class BulkArray(construct.Construct):
+    def __init__(self, count: int, element: construct.Adapter):
+        super().__init__()
+        self.count = count
+        self.element = element
+        self.element_size = element.sizeof()
+        self.array = construct.Array(count, element)
+        if isinstance(element.subcon, FastLEInt) and self.element_size in (1, 8):
+            self.unpacker = struct.Struct(f"<{count}{'B' if self.element_size == 1 else 'Q'}")
+        else:
+            self.unpacker = None
+
+    def _parse(self, stream, context, path) -> construct.ListContainer:
+        length = self.count * self.element_size
+        data = stream.read(length)
+        if len(data) != length:
+            raise construct.StreamError(f"stream read less than specified amount, expected {length}, found {len(data)}")
+
+        if self.unpacker is not None:
+            raw_values = self.unpacker.unpack(data)
+        else:
+            chunks = [data[offset:offset + self.element_size] for offset in range(0, length, self.element_size)]
+            if isinstance(self.element.subcon, FastLEInt):
+                raw_values = [int.from_bytes(chunk, "little") for chunk in chunks]
+            else:
+                raw_values = chunks
+
+        decode = self.element._decode
+        return construct.ListContainer([decode(value, context, path) for value in raw_values])
+
+    def _build(self, obj, stream, context, path):
+        return self.array._build(obj, stream, context, path)
+
+    def _sizeof(self, context, path) -> int:
+        return self.count * self.element_size
+
+
+# The adapters are stateless, so every layout shares these instances instead of building its own.
+_DEC8 = DecimalAdapter()
+_DEC1 = DecimalAdapter(1)
+_FLT16 = FloatAdapter()
+_PK = PublicKeyAdapter()
+_DT = DatetimeAdapter()
+
+
 SERUM_ACCOUNT_FLAGS = construct.BitsSwapped(
     construct.BitStruct(
         "initialized" / construct.Flag,
@@ -84,88 +177,289 @@ MANGO_ACCOUNT_FLAGS = construct.BitsSwapped(
 )
 
 INDEX = construct.Struct(
-    "last_update" / DatetimeAdapter(),
-    "borrow" / FloatAdapter(),
-    "deposit" / FloatAdapter()
+    "last_update" / _DT,
+    "borrow" / _FLT16,
+    "deposit" / _FLT16
 )
 
 AGGREGATOR_CONFIG = construct.Struct(
     "description" / construct.PaddedString(32, "utf8"),
-    "decimals" / DecimalAdapter(1),
-    "restart_delay" / DecimalAdapter(1),
-    "max_submissions" / DecimalAdapter(1),
-    "min_submissions" / DecimalAdapter(1),
-    "reward_amount" / DecimalAdapter(),
-    "reward_token_account" / PublicKeyAdapter()
+    "decimals" / _DEC1,
+    "restart_delay" / _DEC1,
+    "max_submissions" / _DEC1,
+    "min_submissions" / _DEC1,
+    "reward_amount" / _DEC8,
+    "reward_token_account" / _PK
 )
 
 ROUND = construct.Struct(
-    "id" / DecimalAdapter(),
-    "created_at" / DecimalAdapter(),
-    "updated_at" / DecimalAdapter()
+    "id" / _DEC8,
+    "created_at" / _DEC8,
+    "updated_at" / _DEC8
 )
 
 ANSWER = construct.Struct(
-    "round_id" / DecimalAdapter(),
-    "median" / DecimalAdapter(),
-    "created_at" / DatetimeAdapter(),
-    "updated_at" / DatetimeAdapter()
+    "round_id" / _DEC8,
+    "median" / _DEC8,
+    "created_at" / _DT,
+    "updated_at" / _DT
 )
 
 AGGREGATOR = construct.Struct(
     "config" / AGGREGATOR_CONFIG,
-    "initialized" / DecimalAdapter(1),
-    "owner" / PublicKeyAdapter(),
+    "initialized" / _DEC1,
+    "owner" / _PK,
     "round" / ROUND,
-    "round_submissions" / PublicKeyAdapter(),
+    "round_submissions" / _PK,
     "answer" / ANSWER,
-    "answer_submissions" / PublicKeyAdapter()
+    "answer_submissions" / _PK
 )
 
 GROUP_PADDING = 8 - (NUM_TOKENS + NUM_MARKETS) % 8
 
 GROUP = construct.Struct(
     "account_flags" / MANGO_ACCOUNT_FLAGS,
-    "tokens" / construct.Array(NUM_TOKENS, PublicKeyAdapter()),
-    "vaults" / construct.Array(NUM_TOKENS, PublicKeyAdapter()),
+    "tokens" / BulkArray(NUM_TOKENS, _PK),
+    "vaults" / BulkArray(NUM_TOKENS, _PK),
     "indexes" / construct.Array(NUM_TOKENS, INDEX),
-    "spot_markets" / construct.Array(NUM_MARKETS, PublicKeyAdapter()),
-    "oracles" / construct.Array(NUM_MARKETS, PublicKeyAdapter()),
-    "signer_nonce" / DecimalAdapter(),
-    "signer_key" / PublicKeyAdapter(),
-    "dex_program_id" / PublicKeyAdapter(),
-    "total_deposits" / construct.Array(NUM_TOKENS, FloatAdapter()),
-    "total_borrows" / construct.Array(NUM_TOKENS, FloatAdapter()),
-    "maint_coll_ratio" / FloatAdapter(),
-    "init_coll_ratio" / FloatAdapter(),
-    "srm_vault" / PublicKeyAdapter(),
-    "admin" / PublicKeyAdapter(),
-    "borrow_limits" / construct.Array(NUM_TOKENS, DecimalAdapter()),
-    "mint_decimals" / construct.Array(NUM_TOKENS, DecimalAdapter(1)),
-    "oracle_decimals" / construct.Array(NUM_MARKETS, DecimalAdapter(1)),
+    "spot_markets" / BulkArray(NUM_MARKETS, _PK),
+    "oracles" / BulkArray(NUM_MARKETS, _PK),
+    "signer_nonce" / _DEC8,
+    "signer_key" / _PK,
+    "dex_program_id" / _PK,
+    "total_deposits" / BulkArray(NUM_TOKENS, _FLT16),
+    "total_borrows" / BulkArray(NUM_TOKENS, _FLT16),
+    "maint_coll_ratio" / _FLT16,
+    "init_coll_ratio" / _FLT16,
+    "srm_vault" / _PK,
+    "admin" / _PK,
+    "borrow_limits" / BulkArray(NUM_TOKENS, _DEC8),
+    "mint_decimals" / BulkArray(NUM_TOKENS, _DEC1),
+    "oracle_decimals" / BulkArray(NUM_MARKETS, _DEC1),
     "padding" / construct.Array(GROUP_PADDING, construct.Padding(1))
 )
 
 MARGIN_ACCOUNT = construct.Struct(
     "account_flags" / MANGO_ACCOUNT_FLAGS,
-    "mango_group" / PublicKeyAdapter(),
-    "owner" / PublicKeyAdapter(),
-    "deposits" / construct.Array(NUM_TOKENS, FloatAdapter()),
-    "borrows" / construct.Array(NUM_TOKENS, FloatAdapter()),
-    "open_orders" / construct.Array(NUM_MARKETS, PublicKeyAdapter()),
+    "mango_group" / _PK,
+    "owner" / _PK,
+    "deposits" / BulkArray(NUM_TOKENS, _FLT16),
+    "borrows" / BulkArray(NUM_TOKENS, _FLT16),
+    "open_orders" / BulkArray(NUM_MARKETS, _PK),
     "padding" / construct.Padding(8)
 )
 
+# Serum OpenOrders accounts are wrapped in 5 bytes of "serum" at the start and 7 bytes of
+# "padding" at the end.
+OPEN_ORDERS = construct.Struct(
+    construct.Padding(5),
+    "account_flags" / SERUM_ACCOUNT_FLAGS,
+    "market" / _PK,
+    "owner" / _PK,
+    "base_token_free" / _DEC8,
+    "base_token_total" / _DEC8,
+    "quote_token_free" / _DEC8,
+    "quote_token_total" / _DEC8,
+    "free_slot_bits" / DecimalAdapter(16),
+    "is_bid_bits" / DecimalAdapter(16),
+    "orders" / BulkArray(128, DecimalAdapter(16)),
+    "client_ids" / BulkArray(128, _DEC8),
+    "referrer_rebate_accrued" / _DEC8,
+    construct.Padding(7)
+)
+
+# SPL token accounts are 165 bytes, but only the mint, owner and amount at the start are used
+# here. The rest (delegate, state, native and close authority fields) is skipped.
+TOKEN_ACCOUNT = construct.Struct(
+    "mint" / _PK,
+    "owner" / _PK,
+    "amount" / _DEC8,
+    construct.Padding(93)
+)
+
+_TOKEN_ACCOUNT_FORMAT = struct.Struct("<32s32sQ93x")
+_TOKEN_ACCOUNT_FORMAT_MATCHES: bool = _TOKEN_ACCOUNT_FORMAT.size == TOKEN_ACCOUNT.sizeof()
+
+def parse_token_account(data: bytes) -> construct.Container:
+    if not _TOKEN_ACCOUNT_FORMAT_MATCHES:
+        return TOKEN_ACCOUNT.parse(data)
+
+    mint, owner, amount = _TOKEN_ACCOUNT_FORMAT.unpack_from(data)
+    return construct.Container(mint=_public_key_from_bytes(mint), owner=_public_key_from_bytes(owner), amount=amount)
+
+# Parsing OPEN_ORDERS through construct means 260-odd adapter calls per account, and there can be
+# one account per market for every margin account. This does the same job with a single
+# struct.unpack_from() over the fixed layout, producing an identical Container.
+_OPEN_ORDERS_FORMAT = struct.Struct("<5x8s32s32s4Q4Q256Q128QQ7x")
+_OPEN_ORDERS_FORMAT_MATCHES: bool = _OPEN_ORDERS_FORMAT.size == OPEN_ORDERS.sizeof()
+
+def parse_open_orders(data: bytes) -> construct.Container:
+    if not _OPEN_ORDERS_FORMAT_MATCHES:
+        return OPEN_ORDERS.parse(data)
+
+    values = _OPEN_ORDERS_FORMAT.unpack_from(data)
+    u128s = values[7:11] + values[11:267]
+    paired = [u128s[index] | (u128s[index + 1] << 64) for index in range(0, len(u128s), 2)]
+    return construct.Container(
+        account_flags=SERUM_ACCOUNT_FLAGS.parse(values[0]),
+        market=_public_key_from_bytes(values[1]),
+        owner=_public_key_from_bytes(values[2]),
+        base_token_free=values[3],
+        base_token_total=values[4],
+        quote_token_free=values[5],
+        quote_token_total=values[6],
+        free_slot_bits=paired[0],
+        is_bid_bits=paired[1],
+        orders=construct.ListContainer(paired[2:]),
+        client_ids=construct.ListContainer(values[267:395]),
+        referrer_rebate_accrued=values[395]
+    )
+
+# The oracle AGGREGATOR layout is fixed-size as well, and every price fetch parses one per market.
+_AGGREGATOR_FORMAT = struct.Struct("<32s4BQ32sB32s3Q32s4Q32s")
+_AGGREGATOR_FORMAT_MATCHES: bool = _AGGREGATOR_FORMAT.size == AGGREGATOR.sizeof()
+
+def parse_aggregator(data: bytes) -> construct.Container:
+    if not _AGGREGATOR_FORMAT_MATCHES:
+        return AGGREGATOR.parse(data)
+
+    values = _AGGREGATOR_FORMAT.unpack_from(data)
+    return construct.Container(
+        config=construct.Container(
+            description=values[0].rstrip(b"\x00").decode("utf8"),
+            decimals=values[1],
+            restart_delay=values[2],
+            max_submissions=values[3],
+            min_submissions=values[4],
+            reward_amount=values[5],
+            reward_token_account=_public_key_from_bytes(values[6])
+        ),
+        initialized=values[7],
+        owner=_public_key_from_bytes(values[8]),
+        round=construct.Container(id=values[9], created_at=values[10], updated_at=values[11]),
+        round_submissions=_public_key_from_bytes(values[12]),
+        answer=construct.Container(
+            round_id=values[13],
+            median=values[14],
+            created_at=datetime.datetime.fromtimestamp(values[15]),
+            updated_at=datetime.datetime.fromtimestamp(values[16])
+        ),
+        answer_submissions=_public_key_from_bytes(values[17])
+    )
+
+# GROUP and MARGIN_ACCOUNT are fixed-size too, so they get the same treatment. 128-bit fixed-point
+# values are unpacked as pairs of 64-bit halves. These formats have to be kept in step with the
+# GROUP and MARGIN_ACCOUNT Structs above, which remain the reference layouts.
+_FIXED_POINT_DIVISOR = Decimal(2 ** 64)
+
+def _fixed_points(values: typing.Sequence[int]) -> construct.ListContainer:
+    return construct.ListContainer([Decimal(values[index] | (values[index + 1] << 64)) / _FIXED_POINT_DIVISOR
+                                    for index in range(0, len(values), 2)])
+
+def _public_keys(values: typing.Sequence[bytes]) -> construct.ListContainer:
+    return construct.ListContainer([_public_key_from_bytes(value) for value in values])
+
+_GROUP_FORMAT = struct.Struct("<8s" +
+                              "32s" * (NUM_TOKENS * 2) +
+                              "Q4Q" * NUM_TOKENS +
+                              "32s" * (NUM_MARKETS * 2) +
+                              "Q32s32s" +
+                              f"{NUM_TOKENS * 4}Q" +
+                              "4Q32s32s" +
+                              f"{NUM_TOKENS}Q{NUM_TOKENS}B{NUM_MARKETS}B{GROUP_PADDING}x")
+
+# The fast formats are checked against the reference layouts once, at import. If a layout
+# changes and its format isn't updated to match, parsing falls back to the (slower) reference
+# layout instead of returning garbage.
+_GROUP_FORMAT_MATCHES: bool = _GROUP_FORMAT.size == GROUP.sizeof()
+
+def parse_group(data: bytes) -> construct.Container:
+    if not _GROUP_FORMAT_MATCHES:
+        return GROUP.parse(data)
+
+    values = _GROUP_FORMAT.unpack_from(data)
+    offset = 1
+    tokens = _public_keys(values[offset:offset + NUM_TOKENS])
+    offset += NUM_TOKENS
+    vaults = _public_keys(values[offset:offset + NUM_TOKENS])
+    offset += NUM_TOKENS
+    indexes = construct.ListContainer()
+    for _ in range(NUM_TOKENS):
+        borrow, deposit = _fixed_points(values[offset + 1:offset + 5])
+        indexes.append(construct.Container(last_update=datetime.datetime.fromtimestamp(values[offset]),
+                                           borrow=borrow, deposit=deposit))
+        offset += 5
+    spot_markets = _public_keys(values[offset:offset + NUM_MARKETS])
+    offset += NUM_MARKETS
+    oracles = _public_keys(values[offset:offset + NUM_MARKETS])
+    offset += NUM_MARKETS
+    signer_nonce, signer_key, dex_program_id = values[offset:offset + 3]
+    offset += 3
+    total_deposits = _fixed_points(values[offset:offset + NUM_TOKENS * 2])
+    offset += NUM_TOKENS * 2
+    total_borrows = _fixed_points(values[offset:offset + NUM_TOKENS * 2])
+    offset += NUM_TOKENS * 2
+    maint_coll_ratio, init_coll_ratio = _fixed_points(values[offset:offset + 4])
+    offset += 4
+    srm_vault, admin = values[offset:offset + 2]
+    offset += 2
+    borrow_limits = construct.ListContainer(values[offset:offset + NUM_TOKENS])
+    offset += NUM_TOKENS
+    mint_decimals = construct.ListContainer(values[offset:offset + NUM_TOKENS])
+    offset += NUM_TOKENS
+    oracle_decimals = construct.ListContainer(values[offset:offset + NUM_MARKETS])
+    return construct.Container(
+        account_flags=MANGO_ACCOUNT_FLAGS.parse(values[0]),
+        tokens=tokens,
+        vaults=vaults,
+        indexes=indexes,
+        spot_markets=spot_markets,
+        oracles=oracles,
+        signer_nonce=signer_nonce,
+        signer_key=_public_key_from_bytes(signer_key),
+        dex_program_id=_public_key_from_bytes(dex_program_id),
+        total_deposits=total_deposits,
+        total_borrows=total_borrows,
+        maint_coll_ratio=maint_coll_ratio,
+        init_coll_ratio=init_coll_ratio,
+        srm_vault=_public_key_from_bytes(srm_vault),
+        admin=_public_key_from_bytes(admin),
+        borrow_limits=borrow_limits,
+        mint_decimals=mint_decimals,
+        oracle_decimals=oracle_decimals,
+        padding=construct.ListContainer([None] * GROUP_PADDING)
+    )
+
+_MARGIN_ACCOUNT_FORMAT = struct.Struct(f"<8s32s32s{NUM_TOKENS * 4}Q" + "32s" * NUM_MARKETS + "8x")
+_MARGIN_ACCOUNT_FORMAT_MATCHES: bool = _MARGIN_ACCOUNT_FORMAT.size == MARGIN_ACCOUNT.sizeof()
+
+def parse_margin_account(data: bytes) -> construct.Container:
+    if not _MARGIN_ACCOUNT_FORMAT_MATCHES:
+        return MARGIN_ACCOUNT.parse(data)
+
+    values = _MARGIN_ACCOUNT_FORMAT.unpack_from(data)
+    borrows_start = 3 + NUM_TOKENS * 2
+    open_orders_start = borrows_start + NUM_TOKENS * 2
+    return construct.Container(
+        account_flags=MANGO_ACCOUNT_FLAGS.parse(values[0]),
+        mango_group=_public_key_from_bytes(values[1]),
+        owner=_public_key_from_bytes(values[2]),
+        deposits=_fixed_points(values[3:borrows_start]),
+        borrows=_fixed_points(values[borrows_start:open_orders_start]),
+        open_orders=_public_keys(values[open_orders_start:]),
+        padding=None
+    )
+
 MANGO_INSTRUCTION_VARIANT_FINDER = construct.Struct(
     "variant" / construct.BytesInteger(4, swapped=True)
 )
 
 INIT_MANGO_GROUP = construct.Struct(
     "variant" / construct.Const(0x0, construct.BytesInteger(4, swapped=True)),
-    "signer_nonce" / DecimalAdapter(),
-    "maint_coll_ratio" / FloatAdapter(),
-    "init_coll_ratio" / FloatAdapter(),
-    #  "borrow_limits" / construct.Array(NUM_TOKENS, DecimalAdapter())  # This is inconsistently available
+    "signer_nonce" / _DEC8,
+    "maint_coll_ratio" / _FLT16,
+    "init_coll_ratio" / _FLT16,
+    #  "borrow_limits" / construct.Array(NUM_TOKENS, _DEC8)  # This is inconsistently available
 )
 
 INIT_MARGIN_ACCOUNT = construct.Struct(
@@ -174,39 +468,39 @@ INIT_MARGIN_ACCOUNT = construct.Struct(
 
 DEPOSIT = construct.Struct(
     "variant" / construct.Const(0x2, construct.BytesInteger(4, swapped=True)),
-    "quantity" / DecimalAdapter()
+    "quantity" / _DEC8
 )
 
 WITHDRAW = construct.Struct(
     "variant" / construct.Const(0x3, construct.BytesInteger(4, swapped=True)),
-    "quantity" / DecimalAdapter()
+    "quantity" / _DEC8
 )
 
 BORROW = construct.Struct(
     "variant" / construct.Const(0x4, construct.BytesInteger(4, swapped=True)),
-    "token_index" / DecimalAdapter(),
-    "quantity" / DecimalAdapter()
+    "token_index" / _DEC8,
+    "quantity" / _DEC8
 )
 
 SETTLE_BORROW = construct.Struct(
     "variant" / construct.Const(0x5, construct.BytesInteger(4, swapped=True)),
-    "token_index" / DecimalAdapter(),
-    "quantity" / DecimalAdapter()
+    "token_index" / _DEC8,
+    "quantity" / _DEC8
 )
 
 LIQUIDATE = construct.Struct(
     "variant" / construct.Const(0x6, construct.BytesInteger(4, swapped=True)),
-    "deposit_quantities" / construct.Array(NUM_TOKENS, DecimalAdapter())
+    "deposit_quantities" / construct.Array(NUM_TOKENS, _DEC8)
 )
 
 DEPOSIT_SRM = construct.Struct(
     "variant" / construct.Const(0x7, construct.BytesInteger(4, swapped=True)),
-    "quantity" / DecimalAdapter()
+    "quantity" / _DEC8
 )
 
 WITHDRAW_SRM = construct.Struct(
     "variant" / construct.Const(0x8, construct.BytesInteger(4, swapped=True)),
-    "quantity" / DecimalAdapter()
+    "quantity" / _DEC8
 )
 
 PLACE_ORDER = construct.Struct(
@@ -225,13 +519,13 @@ CANCEL_ORDER = construct.Struct(
 
 CANCEL_ORDER_BY_CLIENT_ID = construct.Struct(
     "variant" / construct.Const(0xc, construct.BytesInteger(4, swapped=True)),
-    "client_id" / DecimalAdapter()
+    "client_id" / _DEC8
 )
 
 CHANGE_BORROW_LIMIT = construct.Struct(
     "variant" / construct.Const(0xd, construct.BytesInteger(4, swapped=True)),
-    "token_index" / DecimalAdapter(),
-    "borrow_limit" / DecimalAdapter()
+    "token_index" / _DEC8,
+    "borrow_limit" / _DEC8
 )
 
 PLACE_AND_SETTLE = construct.Struct(
@@ -240,14 +534,58 @@ PLACE_AND_SETTLE = construct.Struct(
 )
 FORCE_CANCEL_ORDERS = construct.Struct(
     "variant" / construct.Const(0xf, construct.BytesInteger(4, swapped=True)),
-    "limit" / DecimalAdapter(1)
+    "limit" / _DEC1
 )
 
 PARTIAL_LIQUIDATE = construct.Struct(
     "variant" / construct.Const(0x10, construct.BytesInteger(4, swapped=True)),
-    "max_deposit" / DecimalAdapter()
+    "max_deposit" / _DEC8
 )
 
+# The instruction layouts without their leading 'variant' field. Once parse_instruction() has read
+# the variant it only needs to parse the rest of the data, and doesn't need to check the variant
+# again through a Const.
+InstructionPayloadParsersByVariant = {
+    variant: construct.Struct(*layout.subcons[1:]) for variant, layout in enumerate([
+        INIT_MANGO_GROUP, INIT_MARGIN_ACCOUNT, DEPOSIT, WITHDRAW, BORROW, SETTLE_BORROW, LIQUIDATE,
+        DEPOSIT_SRM, WITHDRAW_SRM, PLACE_ORDER, SETTLE_FUNDS, CANCEL_ORDER, CANCEL_ORDER_BY_CLIENT_ID,
+        CHANGE_BORROW_LIMIT, PLACE_AND_SETTLE, FORCE_CANCEL_ORDERS, PARTIAL_LIQUIDATE
+    ])
+}
+
+# construct's compile() turns a Struct into generated straight-line Python, which parses much
+# faster than walking the Struct tree field-by-field. Not every construct version can compile every
+# construct, so anything that can't be compiled is left as it is.
+def _compiled(layout: construct.Construct) -> construct.Construct:
+    try:
+        return layout.compile()
+    except (construct.ConstructError, NotImplementedError):
+        return layout
+
+AGGREGATOR = _compiled(AGGREGATOR)
+GROUP = _compiled(GROUP)
+MARGIN_ACCOUNT = _compiled(MARGIN_ACCOUNT)
+OPEN_ORDERS = _compiled(OPEN_ORDERS)
+MANGO_INSTRUCTION_VARIANT_FINDER = _compiled(MANGO_INSTRUCTION_VARIANT_FINDER)
+INIT_MANGO_GROUP = _compiled(INIT_MANGO_GROUP)
+INIT_MARGIN_ACCOUNT = _compiled(INIT_MARGIN_ACCOUNT)
+DEPOSIT = _compiled(DEPOSIT)
+WITHDRAW = _compiled(WITHDRAW)
+BORROW = _compiled(BORROW)
+SETTLE_BORROW = _compiled(SETTLE_BORROW)
+LIQUIDATE = _compiled(LIQUIDATE)
+DEPOSIT_SRM = _compiled(DEPOSIT_SRM)
+WITHDRAW_SRM = _compiled(WITHDRAW_SRM)
+PLACE_ORDER = _compiled(PLACE_ORDER)
+SETTLE_FUNDS = _compiled(SETTLE_FUNDS)
+CANCEL_ORDER = _compiled(CANCEL_ORDER)
+CANCEL_ORDER_BY_CLIENT_ID = _compiled(CANCEL_ORDER_BY_CLIENT_ID)
+CHANGE_BORROW_LIMIT = _compiled(CHANGE_BORROW_LIMIT)
+PLACE_AND_SETTLE = _compiled(PLACE_AND_SETTLE)
+FORCE_CANCEL_ORDERS = _compiled(FORCE_CANCEL_ORDERS)
+PARTIAL_LIQUIDATE = _compiled(PARTIAL_LIQUIDATE)
+InstructionPayloadParsersByVariant = {variant: _compiled(parser) for variant, parser in InstructionPayloadParsersByVariant.items()}
+
 InstructionParsersByVariant = {
     0: INIT_MANGO_GROUP,
     1: INIT_MARGIN_ACCOUNT,
@@ -268,6 +606,13 @@ InstructionParsersByVariant = {
     16: PARTIAL_LIQUIDATE
 }
 
+def parse_instruction(data: bytes) -> typing.Tuple[int, construct.Container]:
+    variant = int.from_bytes(data[0:4], "little")
+    parser = InstructionPayloadParsersByVariant.get(variant)
+    if parser is None:
+        raise Exception(f"Unknown instruction variant: {variant}")
+    return variant, parser.parse(data[4:])
+
 if __name__ == "__main__":
     import base64
     import logging
@@ -1,10 +1,6 @@
+import asyncio
 import logging
 
-from solana.publickey import PublicKey
-
-from baseCli import Group, MarginAccount, TokenValue
-from AccountLiquidator import ForceCancelOrdersAccountLiquidator
-
 MARGIN_ACCOUNT_TO_LIQUIDATE = ""
 
 if __name__ == "__main__":
@@ -13,9 +9,14 @@ if __name__ == "__main__":
     if MARGIN_ACCOUNT_TO_LIQUIDATE == "":
         raise Exception("No margin account to liquidate - try setting the variable MARGIN_ACCOUNT_TO_LIQUIDATE to a margin account public key.")
 
+    from solana.publickey import PublicKey
+
+    from AccountLiquidator import ForceCancelOrdersAccountLiquidator
+    from baseCli import Group, MarginAccount, TokenValue
     from Context import default_context
-    from Wallet import default_wallet
+    from Wallet import get_default_wallet
 
+    default_wallet = get_default_wallet()
     if default_wallet is None:
         print("No default wallet file available.")
     else:
@@ -29,7 +30,7 @@ if __name__ == "__main__":
         intrinsic_balance_sheets_before = margin_account.get_intrinsic_balance_sheets(group)
         print("Margin Account Before:", intrinsic_balance_sheets_before)
         liquidator = ForceCancelOrdersAccountLiquidator(default_context, default_wallet)
-        transaction_id = liquidator.liquidate(group, margin_account, prices)
+        transaction_id = asyncio.run(liquidator.liquidate(group, margin_account, prices))
         if transaction_id is None:
             print("No transaction sent.")
         else:
@@ -37,6 +38,7 @@ if __name__ == "__main__":
             print("Waiting for confirmation...")
 
             default_context.wait_for_confirmation(transaction_id)
+            Group.invalidate_cache(default_context)
 
             group_after = Group.load(default_context)
             margin_account_after_liquidation = MarginAccount.load(default_context, PublicKey(MARGIN_ACCOUNT_TO_LIQUIDATE), group_after)
@@ -1,11 +1,15 @@
+import asyncio
+import heapq
 import logging
 import rx
 import rx.operators as ops
 import time
 import typing
 
+from decimal import Decimal
+
 from AccountLiquidator import AccountLiquidator
-from baseCli import Group, LiquidationEvent, MarginAccount, MarginAccountMetadata, TokenValue
+from baseCli import Group, LiquidationEvent, MarginAccount, MarginAccountMetadata, MarginAccountTable, TokenValue
 from Context import Context
 from Observables import EventSource
 from WalletBalancer import NullWalletBalancer, WalletBalancer
@@ -19,9 +23,11 @@ class LiquidationProcessor:
         self.worthwhile_threshold: float = worthwhile_threshold
         self.liquidations: EventSource[LiquidationEvent] = EventSource[LiquidationEvent]()
         self.ripe_accounts: typing.Optional[typing.List[MarginAccount]] = None
+        self.ripe_account_table: typing.Optional[MarginAccountTable] = None
 
     def update_margin_accounts(self, ripe_margin_accounts: typing.List[MarginAccount]):
-        self.logger.info(f"Received {len(ripe_margin_accounts)} ripe 🥭 margin accounts to process.")
+        self.logger.info("Received %d ripe 🥭 margin accounts to process.", len(ripe_margin_accounts))
+        self.ripe_account_table = MarginAccountTable.from_margin_accounts(ripe_margin_accounts)
         self.ripe_accounts = ripe_margin_accounts
 
     def update_prices(self, prices):
@@ -31,62 +37,92 @@ class LiquidationProcessor:
             self.logger.info("Ripe accounts is None - skipping")
             return
 
-        self.logger.info(f"Running on {len(self.ripe_accounts)} ripe accounts.")
+        self.logger.info("Running on %d ripe accounts.", len(self.ripe_accounts))
+        # Interest indexes, deposits and borrows feed the collateral ratios, so the Group is only
+        # ever as old as Group.load()'s short cache allows (and that's invalidated after each
+        # liquidation).
         group = Group.load(self.context)
-        updated: typing.List[MarginAccountMetadata] = []
-        for margin_account in self.ripe_accounts:
-            balance_sheet = margin_account.get_balance_sheet_totals(group, prices)
-            balances = margin_account.get_intrinsic_balances(group)
-            updated += [MarginAccountMetadata(margin_account, balance_sheet, balances)]
-
-        liquidatable = list(filter(lambda mam: mam.balance_sheet.collateral_ratio <= group.maint_coll_ratio, updated))
-        self.logger.info(f"Of those {len(updated)}, {len(liquidatable)} are liquidatable.")
-
-        above_water = list(filter(lambda mam: mam.collateral_ratio > 1, liquidatable))
-        self.logger.info(f"Of those {len(liquidatable)} liquidatable margin accounts, {len(above_water)} are 'above water' margin accounts with assets greater than their liabilities.")
-
-        worthwhile = list(filter(lambda mam: mam.assets - mam.liabilities > self.worthwhile_threshold, above_water))
-        self.logger.info(f"Of those {len(above_water)} above water margin accounts, {len(worthwhile)} are worthwhile margin accounts with more than ${self.worthwhile_threshold} net assets.")
-
-        self._liquidate_all(group, prices, worthwhile)
+        # Classify every account in a single pass: liquidatable, then above water, then worthwhile.
+        # Only the totals are needed to classify an account, and those come from the column-wise
+        # table. Full balance sheets and per-token intrinsic balances are only worked out for the
+        # (few) accounts that are worth liquidating.
+        liquidatable_count = 0
+        above_water_count = 0
+        worthwhile: typing.List[MarginAccountMetadata] = []
+        maint_coll_ratio = group.maint_coll_ratio
+        worthwhile_threshold = self.worthwhile_threshold
+        ripe_account_table = self.ripe_account_table
+        all_assets, all_liabilities = ripe_account_table.get_balance_sheet_totals(group, prices)
+        for margin_account, assets, liabilities in zip(ripe_account_table.margin_accounts, all_assets, all_liabilities):
+            collateral_ratio = Decimal(0) if liabilities == 0 else assets / liabilities
+            if collateral_ratio > maint_coll_ratio:
+                continue
+            liquidatable_count += 1
+            if collateral_ratio <= 1:
+                continue
+            above_water_count += 1
+            if assets - liabilities > worthwhile_threshold:
+                balance_sheet = margin_account.get_balance_sheet_totals(group, prices)
+                balances = margin_account.get_intrinsic_balances(group)
+                worthwhile.append(MarginAccountMetadata(margin_account, balance_sheet, balances))
+
+        self.logger.info("Of those %d, %d are liquidatable.", len(self.ripe_accounts), liquidatable_count)
+        self.logger.info("Of those %d liquidatable margin accounts, %d are 'above water' margin accounts with assets greater than their liabilities.", liquidatable_count, above_water_count)
+        self.logger.info("Of those %d above water margin accounts, %d are worthwhile margin accounts with more than $%s net assets.", above_water_count, len(worthwhile), worthwhile_threshold)
+
+        asyncio.run(self._liquidate_all(group, prices, worthwhile))
 
         time_taken = time.time() - started_at
-        self.logger.info(f"Check of all ripe 🥭 accounts complete. Time taken: {time_taken:.2f} seconds.")
-
-    def _liquidate_all(self, group: Group, prices: typing.List[TokenValue], to_liquidate: typing.List[MarginAccountMetadata]):
-        to_process = to_liquidate
+        self.logger.info("Check of all ripe 🥭 accounts complete. Time taken: %.2f seconds.", time_taken)
+
+    async def _liquidate_all(self, group: Group, prices: typing.List[TokenValue], to_liquidate: typing.List[MarginAccountMetadata]):
+        # A max-heap on net assets, so the most valuable account is always the next one processed
+        # without having to re-sort everything each time round. id() breaks ties so the heap never
+        # needs to compare MarginAccountMetadata objects.
+        #
+        # Accounts are liquidated one at a time, not gathered: each liquidation changes the wallet's
+        # balances, and an account is reloaded and possibly put back on the heap before the next
+        # one is chosen. The whole sweep does share one event loop, though.
+        to_process = [(-(mam.assets - mam.liabilities), id(mam), mam) for mam in to_liquidate]
+        heapq.heapify(to_process)
+        account_liquidator = self.account_liquidator
+        wallet_balancer = self.wallet_balancer
+        worthwhile_threshold = self.worthwhile_threshold
+        loop = asyncio.get_running_loop()
         while len(to_process) > 0:
-            highest_first = sorted(to_process, key=lambda mam: mam.assets - mam.liabilities, reverse=True)
-            highest = highest_first[0]
+            _, _, highest = heapq.heappop(to_process)
             try:
-                self.account_liquidator.liquidate(group, highest.margin_account, prices)
-                self.wallet_balancer.balance(prices)
+                await account_liquidator.liquidate(group, highest.margin_account, prices)
+                # Balancing and reloading are blocking (and the trade executor runs its own event
+                # loop to wait for fills), so they run on a worker thread rather than in this loop.
+                await loop.run_in_executor(None, wallet_balancer.balance, prices)
 
-                updated_margin_account = MarginAccount.load(self.context, highest.margin_account.address, group)
+                updated_margin_account = await loop.run_in_executor(None, MarginAccount.load, self.context, highest.margin_account.address, group)
                 balance_sheet = updated_margin_account.get_balance_sheet_totals(group, prices)
                 balances = updated_margin_account.get_intrinsic_balances(group)
                 updated_mam = MarginAccountMetadata(updated_margin_account, balance_sheet, balances)
-                if updated_mam.assets - updated_mam.liabilities > self.worthwhile_threshold:
-                    self.logger.info(f"Margin account {updated_margin_account.address} has been drained and is no longer worthwhile.")
+                updated_net = balance_sheet.assets - balance_sheet.liabilities
+                # Only base58-encode the address if the message is actually going to be logged.
+                log_info = self.logger.isEnabledFor(logging.INFO)
+                if updated_net > worthwhile_threshold:
+                    if log_info:
+                        self.logger.info(f"Margin account {updated_margin_account.address} has been drained and is no longer worthwhile.")
                 else:
-                    self.logger.info(f"Margin account {updated_margin_account.address} is still worthwhile - putting it back on list.")
-                    to_process += [updated_mam]
+                    if log_info:
+                        self.logger.info(f"Margin account {updated_margin_account.address} is still worthwhile - putting it back on list.")
+                    heapq.heappush(to_process, (-updated_net, id(updated_mam), updated_mam))
             except Exception as exception:
                 self.logger.error(f"Failed to liquidate account '{highest.margin_account.address}' - {exception}")
-            finally:
-                # highest should always be in to_process, but we're outside the try-except block
-                # so let's be a little paranoid about it.
-                if highest in to_process:
-                    to_process.remove(highest)
 
 if __name__ == "__main__":
     from AccountLiquidator import NullAccountLiquidator
     from Context import default_context
     from Observables import create_backpressure_skipping_observer, log_subscription_error
-    from Wallet import default_wallet
+    from Wallet import get_default_wallet
 
     from rx.scheduler import ThreadPoolScheduler
 
+    default_wallet = get_default_wallet()
     if default_wallet is None:
         raise Exception("No wallet")
 
@@ -1,11 +1,25 @@
 import abc
 import logging
+import queue
 import requests
+import requests.adapters
+import threading
+import time
 import typing
 
+from urllib3.util.retry import Retry
+
+# Notifications can come in bursts, so don't let a slow endpoint hold things up for long.
+NOTIFICATION_TIMEOUT_SECONDS = 5
+
 class NotificationTarget(metaclass=abc.ABCMeta):
     def __init__(self):
         self.logger: logging.Logger = logging.getLogger(self.__class__.__name__)
+        # A session per target keeps the HTTPS connection alive between notifications instead of
+        # setting up a new connection for every one.
+        self.session: requests.Session = requests.Session()
+        self.session.mount("https://", requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=4,
+                                                                     max_retries=Retry(total=2, backoff_factor=0.2)))
 
     def send(self, item: typing.Any) -> None:
         try:
@@ -31,7 +45,7 @@ class TelegramNotificationTarget(NotificationTarget):
         payload = {"disable_notification": True, "chat_id": self.chat_id, "text": str(item)}
         url = f"https://api.telegram.org/bot{self.bot_id}/sendMessage"
         headers = {"Content-Type": "application/json"}
-        requests.post(url, json=payload, headers=headers)
+        self.session.post(url, json=payload, headers=headers, timeout=NOTIFICATION_TIMEOUT_SECONDS)
 
     def __str__(self) -> str:
         return f"Telegram chat ID: {self.chat_id}"
@@ -47,7 +61,7 @@ class DiscordNotificationTarget(NotificationTarget):
         }
         url = self.address
         headers = {"Content-Type": "application/json"}
-        requests.post(url, json=payload, headers=headers)
+        self.session.post(url, json=payload, headers=headers, timeout=NOTIFICATION_TIMEOUT_SECONDS)
 
     def __str__(self) -> str:
         return "Discord webhook"
@@ -62,14 +76,76 @@ def parse_subscription_target(target):
     else:
         raise Exception(f"Unknown protocol: {protocol}")
 
+# Sending a notification is a network round-trip, so NotificationHandler queues messages and sends
+# them from a background thread - logging never has to wait on Telegram or Discord. If the queue
+# fills up, new messages are dropped rather than blocking the caller, and a count of them is sent
+# once there's room again.
+NOTIFICATION_QUEUE_SIZE = 1024
+
+# How long close() (called by logging.shutdown() at exit) waits for queued notifications to go out.
+NOTIFICATION_CLOSE_TIMEOUT_SECONDS = 10
+
 class NotificationHandler(logging.StreamHandler):
     def __init__(self, target: NotificationTarget):
         logging.StreamHandler.__init__(self)
         self.target = target
+        self._queue: queue.Queue = queue.Queue(maxsize=NOTIFICATION_QUEUE_SIZE)
+        self._dropped_lock: threading.Lock = threading.Lock()
+        self._dropped: int = 0
+        self._worker_thread = threading.Thread(target=self._worker, name="NotificationHandler", daemon=True)
+        self._worker_thread.start()
 
     def emit(self, record):
-        message = self.format(record)
-        self.target.send_notification(message)
+        try:
+            self._queue.put_nowait(self.format(record))
+        except queue.Full:
+            with self._dropped_lock:
+                self._dropped += 1
+
+    def flush(self):
+        self._wait_until_sent(NOTIFICATION_CLOSE_TIMEOUT_SECONDS)
+
+    def close(self):
+        # The worker is a daemon thread, so anything still queued at exit would otherwise be lost -
+        # often the last error or liquidation before a crash. Wait (for a while) for it to go out.
+        self._wait_until_sent(NOTIFICATION_CLOSE_TIMEOUT_SECONDS)
+        self._send_dropped_count()
+        logging.StreamHandler.close(self)
+
+    def _wait_until_sent(self, timeout: float) -> bool:
+        deadline = time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks > 0:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._queue.all_tasks_done.wait(remaining)
+        return True
+
+    def _send_dropped_count(self):
+        with self._dropped_lock:
+            dropped = self._dropped
+            self._dropped = 0
+        if dropped > 0:
+            self._send(f"{dropped} notification(s) were dropped because the notification queue was full.")
+
+    def _send(self, message: str):
+        try:
+            self.target.send_notification(message)
+        except Exception:
+            # Don't log this - the log record would just come back round to this handler
+            # and fail again.
+            pass
+
+    def _worker(self):
+        while True:
+            message = self._queue.get()
+            try:
+                self._send(message)
+                if self._queue.empty():
+                    self._send_dropped_count()
+            finally:
+                self._queue.task_done()
 
 def _notebook_tests():
     test_target = parse_subscription_target("telegram:chat@bot")
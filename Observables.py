@@ -1,11 +1,11 @@
+import collections
 import datetime
 import logging
 import rx
 import rx.operators as ops
+import threading
 import typing
 
-from rxpy_backpressure import BackPressure
-
 class PrintingObserverSubscriber(rx.core.typing.Observer):
     def __init__(self, report_no_output: bool) -> None:
         super().__init__()
@@ -36,7 +36,7 @@ class CollectingObserverSubscriber(rx.core.typing.Observer):
         self.collected: typing.List[typing.Any] = []
 
     def on_next(self, item: typing.Any) -> None:
-        self.collected += [item]
+        self.collected.append(item)
 
     def on_error(self, ex: Exception) -> None:
         self.logger.error(f"Received error: {ex}")
@@ -74,9 +74,49 @@ class FunctionObserver(rx.core.typing.Observer):
     def on_completed(self) -> None:
         self._on_completed()
 
+# Passes items on to an inner observer from a background thread, skipping any items that arrive
+# while the inner observer is still busy - when it's ready again it only gets the newest one.
+# Older prices (for instance) are useless once a newer one has arrived.
+#
+# The single-slot deque does the handover: append() and pop() are atomic, so the producer never
+# takes a lock and an item can't be delivered twice.
+class LatestObserver(rx.core.typing.Observer):
+    def __init__(self, inner: rx.core.typing.Observer):
+        self.logger: logging.Logger = logging.getLogger(self.__class__.__name__)
+        self.inner: rx.core.typing.Observer = inner
+        self._latest: typing.Deque[typing.Any] = collections.deque(maxlen=1)
+        self._available: threading.Event = threading.Event()
+        self._worker_thread = threading.Thread(target=self._worker, name=self.__class__.__name__, daemon=True)
+        self._worker_thread.start()
+
+    def on_next(self, value: typing.Any) -> None:
+        self._latest.append(value)
+        self._available.set()
+
+    def on_error(self, error: Exception) -> None:
+        self.inner.on_error(error)
+
+    def on_completed(self) -> None:
+        self.inner.on_completed()
+
+    def _worker(self) -> None:
+        while True:
+            self._available.wait()
+            self._available.clear()
+            try:
+                value = self._latest.pop()
+            except IndexError:
+                continue
+
+            try:
+                self.inner.on_next(value)
+            except Exception as exception:
+                self.logger.error(f"Error processing item '{value}' - {exception}")
+                self.inner.on_error(exception)
+
 def create_backpressure_skipping_observer(on_next: typing.Callable[[typing.Any], None], on_error: typing.Callable[[Exception], None] = lambda _: None, on_completed: typing.Callable[[], None] = lambda: None) -> rx.core.typing.Observer:
     observer = FunctionObserver(on_next=on_next, on_error=on_error, on_completed=on_completed)
-    return BackPressure.LATEST(observer)
+    return LatestObserver(observer)
 
 
 def debug_print_item(title: str) -> typing.Callable[[typing.Any], typing.Any]:
@@ -0,0 +1,70 @@
+import asyncio
+import logging
+import threading
+import time
+import typing
+
+from decimal import Decimal
+from pyserum.market import Market
+from pyserum.market.orderbook import OrderBook
+from solana.publickey import PublicKey
+
+from Context import Context
+
+# How long to wait before re-subscribing after a websocket subscription drops.
+RESUBSCRIBE_DELAY_SECONDS = 5
+
+# Keeps the best bid and best ask for markets up to date from websocket subscriptions to their
+# bids and asks accounts, so reading the top of the book doesn't need an RPC call. Prices are
+# None until the first update arrives for a market - callers should fall back to loading the
+# order book themselves in that case.
+class OrderBookCache:
+    def __init__(self, context: Context):
+        self.logger: logging.Logger = logging.getLogger(self.__class__.__name__)
+        self.context: Context = context
+        self._lock: threading.Lock = threading.Lock()
+        self._best_bids: typing.Dict[PublicKey, typing.Optional[Decimal]] = {}
+        self._best_asks: typing.Dict[PublicKey, typing.Optional[Decimal]] = {}
+
+    def watch(self, market: Market) -> None:
+        address = market.state.public_key()
+        with self._lock:
+            if address in self._best_bids:
+                return
+            self._best_bids[address] = None
+            self._best_asks[address] = None
+
+        self._start_subscription(market, market.state.bids(), self._best_bids)
+        self._start_subscription(market, market.state.asks(), self._best_asks)
+
+    def best_bid(self, market: Market) -> typing.Optional[Decimal]:
+        return self._best_bids.get(market.state.public_key())
+
+    def best_ask(self, market: Market) -> typing.Optional[Decimal]:
+        return self._best_asks.get(market.state.public_key())
+
+    def _start_subscription(self, market: Market, slab_address: PublicKey, best_prices: typing.Dict[PublicKey, typing.Optional[Decimal]]) -> None:
+        address = market.state.public_key()
+
+        def update(data: bytes) -> bool:
+            top = OrderBook.from_bytes(market.state, data).get_l2(1)
+            best_prices[address] = Decimal(top[0].price) if len(top) > 0 else None
+            return False
+
+        def run() -> None:
+            while True:
+                try:
+                    asyncio.run(self.context.subscribe_account(slab_address, update))
+                except Exception as exception:
+                    self.logger.warning(f"Order book subscription to {slab_address} failed - {exception}")
+                best_prices[address] = None
+                time.sleep(RESUBSCRIBE_DELAY_SECONDS)
+
+        thread = threading.Thread(target=run, name=f"OrderBookCache-{slab_address}", daemon=True)
+        thread.start()
+
+    def __str__(self) -> str:
+        return f"« OrderBookCache [{len(self._best_bids)} markets] »"
+
+    def __repr__(self) -> str:
+        return f"{self}"
@@ -1,28 +1,32 @@
 import logging
+import time
 import typing
 
 from contextlib import contextmanager
 
 class Retrier:
-    def __init__(self, func: typing.Callable, retries: int) -> None:
+    def __init__(self, func: typing.Callable, retries: int, backoff: float = 0.0) -> None:
         self.logger: logging.Logger = logging.getLogger(self.__class__.__name__)
         self.func: typing.Callable = func
         self.retries: int = retries
+        self.backoff: float = backoff
 
     def run(self, *args):
-        captured_exception: Exception = None
-        for counter in range(self.retries):
+        # Every attempt but the last catches and logs failures. The last attempt isn't wrapped, so
+        # its exception propagates to the caller as-is.
+        for counter in range(self.retries - 1):
             try:
                 return self.func(*args)
             except Exception as exception:
                 self.logger.info(f"Retriable call failed [{counter}] with error '{exception}'. Retrying...")
-                captured_exception = exception
+                if self.backoff > 0:
+                    time.sleep(self.backoff * (2 ** counter))
 
-        raise captured_exception
+        return self.func(*args)
 
 @contextmanager
-def retry_context(func: typing.Callable, retries: int = 3) -> typing.Iterator[Retrier]:
-    yield Retrier(func, retries)
+def retry_context(func: typing.Callable, retries: int = 3, backoff: float = 0.0) -> typing.Iterator[Retrier]:
+    yield Retrier(func, retries, backoff)
 
 if __name__ == "__main__":
     logging.getLogger().setLevel(logging.INFO)
@@ -1,17 +1,23 @@
 import abc
+import asyncio
 import logging
 import rx
 import rx.operators as ops
+import time
 import typing
 
 from decimal import Decimal
 from pyserum.enums import OrderType, Side
 from pyserum.market import Market
+from pyserum.market._internal.queue import decode_event_queue
 from solana.account import Account
 from solana.publickey import PublicKey
+from solana.transaction import Transaction
 
-from baseCli import BasketToken, Group, MarketMetadata, OpenOrders, Token, TokenAccount
+from baseCli import Group, MarketMetadata, OpenOrders, Token, TokenAccount
+from Constants import ONE, ZERO
 from Context import Context
+from OrderBookCache import OrderBookCache
 from Retrier import retry_context
 from Wallet import Wallet
 
@@ -58,12 +64,13 @@ class NullTradeExecutor(TradeExecutor):
         self.reporter("Skipping waiting for settlement.")
 
 class SerumImmediateTradeExecutor(TradeExecutor):
-    def __init__(self, context: Context, wallet: Wallet, group: Group, price_adjustment_factor: Decimal = Decimal(0), reporter: typing.Callable[[str], None] = None):
+    def __init__(self, context: Context, wallet: Wallet, group: Group, price_adjustment_factor: Decimal = ZERO, reporter: typing.Callable[[str], None] = None, order_book_cache: typing.Optional[OrderBookCache] = None):
         super().__init__()
         self.context: Context = context
         self.wallet: Wallet = wallet
         self.group: Group = group
         self.price_adjustment_factor: Decimal = price_adjustment_factor
+        self.order_book_cache: OrderBookCache = order_book_cache or OrderBookCache(context)
 
         def report(text):
             self.logger.info(text)
@@ -72,25 +79,37 @@ class SerumImmediateTradeExecutor(TradeExecutor):
         def just_log(text):
             self.logger.info(text)
 
+        self._has_reporter: bool = reporter is not None
         if reporter is not None:
             self.reporter = report
         else:
             self.reporter = just_log
 
+    # Some report messages are expensive to build (they stringify whole markets and accounts), so
+    # they're only built if a reporter was provided or INFO logging is on.
+    def _reporting_enabled(self) -> bool:
+        return self._has_reporter or self.logger.isEnabledFor(logging.INFO)
+
     def buy(self, symbol: str, quantity: Decimal):
         market_metadata, base_token, quote_token = self._tokens_and_market(symbol)
-        market = market_metadata.fetch_market(self.context)
-        self.reporter(f"BUY order market: {market_metadata.address} {market}")
-
-        asks = market.load_asks()
-        top_ask = next(asks.orders())
-        top_price = Decimal(top_ask.info.price)
-        increase_factor = Decimal(1) + self.price_adjustment_factor
+        market = self._get_market(market_metadata)
+        if self._reporting_enabled():
+            self.reporter(f"BUY order market: {market_metadata.address} {market}")
+
+        # The cache only has prices once its subscription has seen an update, so the first trade on
+        # a market still loads the asks.
+        self.order_book_cache.watch(market)
+        top_price = self.order_book_cache.best_ask(market)
+        if top_price is None:
+            top_price = Decimal(market.load_asks().get_l2(1)[0].price)
+        increase_factor = ONE + self.price_adjustment_factor
         price = top_price * increase_factor
         self.reporter(f"Price {price} - adjusted by {self.price_adjustment_factor} from {top_price}")
 
-        source_token_account = TokenAccount.fetch_largest_for_owner_and_token(self.context, self.wallet.address, quote_token)
-        self.reporter(f"Source token account: {source_token_account}")
+        token_accounts = TokenAccount.fetch_all_for_owner(self.context, self.wallet.address)
+        source_token_account = TokenAccount.find_largest(token_accounts.get(quote_token.mint, []))
+        if self._reporting_enabled():
+            self.reporter(f"Source token account: {source_token_account}")
         if source_token_account is None:
             raise Exception(f"Could not find source token account for '{quote_token}'")
 
@@ -102,24 +121,30 @@ class SerumImmediateTradeExecutor(TradeExecutor):
             base_token,
             quote_token,
             price,
-            quantity
+            quantity,
+            token_accounts
         )
 
     def sell(self, symbol: str, quantity: Decimal):
         market_metadata, base_token, quote_token = self._tokens_and_market(symbol)
-        market = market_metadata.fetch_market(self.context)
-        self.reporter(f"SELL order market: {market_metadata.address} {market}")
-
-        bids = market.load_bids()
-        bid_orders = list(bids.orders())
-        top_bid = bid_orders[len(bid_orders) - 1]
-        top_price = Decimal(top_bid.info.price)
-        decrease_factor = Decimal(1) - self.price_adjustment_factor
+        market = self._get_market(market_metadata)
+        if self._reporting_enabled():
+            self.reporter(f"SELL order market: {market_metadata.address} {market}")
+
+        self.order_book_cache.watch(market)
+        top_price = self.order_book_cache.best_bid(market)
+        if top_price is None:
+            # get_l2() walks the slab from the best price, so this doesn't build a list of every bid
+            # just to take the last one.
+            top_price = Decimal(market.load_bids().get_l2(1)[0].price)
+        decrease_factor = ONE - self.price_adjustment_factor
         price = top_price * decrease_factor
         self.reporter(f"Price {price} - adjusted by {self.price_adjustment_factor} from {top_price}")
 
-        source_token_account = TokenAccount.fetch_largest_for_owner_and_token(self.context, self.wallet.address, base_token)
-        self.reporter(f"Source token account: {source_token_account}")
+        token_accounts = TokenAccount.fetch_all_for_owner(self.context, self.wallet.address)
+        source_token_account = TokenAccount.find_largest(token_accounts.get(base_token.mint, []))
+        if self._reporting_enabled():
+            self.reporter(f"Source token account: {source_token_account}")
         if source_token_account is None:
             raise Exception(f"Could not find source token account for '{base_token}'")
 
@@ -131,22 +156,24 @@ class SerumImmediateTradeExecutor(TradeExecutor):
             base_token,
             quote_token,
             price,
-            quantity
+            quantity,
+            token_accounts
         )
 
-    def _execute(self, market_metadata: MarketMetadata, market: Market, side: Side, source_token_account: TokenAccount, base_token: Token, quote_token: Token, price: Decimal, quantity: Decimal):
+    def _execute(self, market_metadata: MarketMetadata, market: Market, side: Side, source_token_account: TokenAccount, base_token: Token, quote_token: Token, price: Decimal, quantity: Decimal, token_accounts: typing.Dict[PublicKey, typing.List[TokenAccount]]):
         client_id, place_order_transaction_id = self._place_order(market_metadata, market, base_token, quote_token, source_token_account.address, self.wallet.account, OrderType.IOC, side, price, quantity)
         self._wait_for_order_fill(market, client_id)
-        settlement_transaction_ids = self.settle(market_metadata, market)
+        settlement_transaction_ids = self.settle(market_metadata, market, token_accounts)
         self.wait_for_settlement_completion(settlement_transaction_ids)
         self.reporter("Order execution complete")
 
     def _place_order(self, market_metadata: MarketMetadata, market: Market, base_token: Token, quote_token: Token, paying_token_address: PublicKey, account: Account, order_type: OrderType, side: Side, price: Decimal, quantity: Decimal) -> typing.Tuple[int, str]:
         to_pay = price * quantity
-        self.logger.info(f"{side.name}ing {quantity} of {base_token.name} at {price} for {to_pay} on {base_token.name}/{quote_token.name} from {paying_token_address}.")
+        self.logger.info("%sing %s of %s at %s for %s on %s/%s from %s.", side.name, quantity, base_token.name, price, to_pay, base_token.name, quote_token.name, paying_token_address)
 
         client_id = self.context.random_client_id()
-        self.reporter(f"""Placing order
+        if self._reporting_enabled():
+            self.reporter(f"""Placing order
     paying_token_address: {paying_token_address}
     account: {account.public_key()}
     order_type: {order_type.name}
@@ -163,7 +190,12 @@ class SerumImmediateTradeExecutor(TradeExecutor):
         return client_id, transaction_id
 
     def _wait_for_order_fill(self, market: Market, client_id: int, max_wait_in_seconds: int = 60):
-        self.logger.info(f"Waiting up to {max_wait_in_seconds} seconds for {client_id}.")
+        self.logger.info("Waiting up to %s seconds for %s.", max_wait_in_seconds, client_id)
+        try:
+            return asyncio.run(self._wait_for_order_fill_async(market, client_id, max_wait_in_seconds))
+        except Exception as exception:
+            self.logger.warning(f"Could not subscribe to event queue - falling back to polling: {exception}")
+
         return rx.interval(1.0).pipe(
             ops.flat_map(lambda _: market.load_event_queue()),
             ops.skip_while(lambda item: item.client_order_id != client_id),
@@ -173,48 +205,107 @@ class SerumImmediateTradeExecutor(TradeExecutor):
             ops.timeout(max_wait_in_seconds, rx.return_value(False))
         ).run()
 
-    def settle(self, market_metadata: MarketMetadata, market: Market) -> typing.List[str]:
-        base_token_account = TokenAccount.fetch_or_create_largest_for_owner_and_token(self.context, self.wallet.account, market_metadata.base.token)
-        quote_token_account = TokenAccount.fetch_or_create_largest_for_owner_and_token(self.context, self.wallet.account, market_metadata.quote.token)
+    async def _wait_for_order_fill_async(self, market: Market, client_id: int, max_wait_in_seconds: int) -> bool:
+        # Watches the event queue over a websocket subscription instead of re-downloading it every
+        # second. The fill may already have happened, so the current queue is checked too - but
+        # only once the subscription is confirmed, so a fill landing in between is seen by one or
+        # the other. Whichever sees it first wins.
+        def is_filled(events) -> bool:
+            return any(event.client_order_id == client_id and event.event_flags.fill for event in events)
+
+        deadline = time.monotonic() + max_wait_in_seconds
+        subscribed = asyncio.Event()
+        subscription = asyncio.ensure_future(self.context.subscribe_account(market.state.event_queue(), lambda data: is_filled(decode_event_queue(data)), subscribed))
+        confirmation = asyncio.ensure_future(subscribed.wait())
+        try:
+            done, _ = await asyncio.wait([subscription, confirmation], timeout=max_wait_in_seconds, return_when=asyncio.FIRST_COMPLETED)
+            if subscription in done:
+                # Re-raises if the subscription failed, so the caller can fall back to polling.
+                subscription.result()
+                return True
+            if confirmation not in done:
+                return False
+
+            # load_event_queue() is blocking, so keep it off the event loop while the subscription
+            # carries on receiving.
+            loop = asyncio.get_running_loop()
+            if await loop.run_in_executor(None, lambda: is_filled(market.load_event_queue())):
+                return True
+
+            await asyncio.wait_for(subscription, timeout=max(deadline - time.monotonic(), 0))
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            confirmation.cancel()
+            subscription.cancel()
+
+    def settle(self, market_metadata: MarketMetadata, market: Market, token_accounts: typing.Optional[typing.Dict[PublicKey, typing.List[TokenAccount]]] = None) -> typing.List[str]:
+        # Settlement only needs the addresses of the token accounts, so the ones fetched before the
+        # trade can be reused. An account is only created if the owner has none for the token.
+        if token_accounts is None:
+            token_accounts = TokenAccount.fetch_all_for_owner(self.context, self.wallet.address)
+        base_token = market_metadata.base.token
+        quote_token = market_metadata.quote.token
+        base_token_account = TokenAccount.find_largest_or_create(self.context, self.wallet.account, base_token, token_accounts.get(base_token.mint, []))
+        quote_token_account = TokenAccount.find_largest_or_create(self.context, self.wallet.account, quote_token, token_accounts.get(quote_token.mint, []))
 
         open_orders = OpenOrders.load_for_market_and_owner(self.context, market_metadata.address, self.wallet.account.public_key(), self.context.dex_program_id, market_metadata.base.token.decimals, market_metadata.quote.token.decimals)
 
-        transaction_ids = []
+        vault_signer = PublicKey.create_program_address(
+            [bytes(market.state.public_key()), market.state.vault_signer_nonce().to_bytes(8, byteorder="little")],
+            market.state.program_id()
+        )
+
+        # Build all the settlement transactions first, then send them together in one batch.
+        to_settle: typing.List[OpenOrders] = []
+        transactions: typing.List[Transaction] = []
         for open_order_account in open_orders:
             if (open_order_account.base_token_free > 0) or (open_order_account.quote_token_free > 0):
-                self.reporter(f"Need to settle open orders: {open_order_account}\nBase account: {base_token_account.address}\nQuote account: {quote_token_account.address}")
-                response = market.settle_funds(self.wallet.account, open_order_account.to_pyserum(), base_token_account.address, quote_token_account.address)
+                if self._reporting_enabled():
+                    self.reporter(f"Need to settle open orders: {open_order_account}\nBase account: {base_token_account.address}\nQuote account: {quote_token_account.address}")
+                instruction = market.make_settle_funds_instruction(open_order_account.to_pyserum(), base_token_account.address, quote_token_account.address, vault_signer)
+                to_settle.append(open_order_account)
+                transactions.append(Transaction().add(instruction))
+
+        responses = self.context.send_multiple_transactions(transactions, self.wallet.account)
+
+        transaction_ids = []
+        for open_order_account, response in zip(to_settle, responses):
+            try:
                 transaction_id = self.context.unwrap_transaction_id_or_raise_exception(response)
                 self.reporter(f"Settlement transaction ID: {transaction_id}")
-                transaction_ids += [transaction_id]
+                transaction_ids.append(transaction_id)
+            except Exception as exception:
+                self.logger.error(f"Failed to settle open orders account '{open_order_account.address}' - {exception}")
 
         return transaction_ids
 
     def wait_for_settlement_completion(self, settlement_transaction_ids: typing.List[str]):
         if len(settlement_transaction_ids) > 0:
             self.reporter(f"Waiting on settlement transaction IDs: {settlement_transaction_ids}")
-            for settlement_transaction_id in settlement_transaction_ids:
-                self.reporter(f"Waiting on specific settlement transaction ID: {settlement_transaction_id}")
-                self.context.wait_for_confirmation(settlement_transaction_id)
-            self.reporter("All settlement transaction IDs confirmed.")
+            confirmed = self.context.confirm_multiple_transactions(settlement_transaction_ids)
+            unconfirmed = [transaction_id for transaction_id in settlement_transaction_ids if not confirmed[transaction_id]]
+            if len(unconfirmed) > 0:
+                self.reporter(f"Settlement transaction IDs not confirmed: {unconfirmed}")
+            else:
+                self.reporter("All settlement transaction IDs confirmed.")
+
+    def _get_market(self, market_metadata: MarketMetadata) -> Market:
+        return market_metadata.load_market(self.context)
 
     def _tokens_and_market(self, symbol: str) -> typing.Tuple[MarketMetadata, Token, Token]:
-        base_token = BasketToken.find_by_name(self.group.basket_tokens, symbol).token
+        base_token = self.group.find_basket_token_by_name(symbol).token
         quote_token = self.group.shared_quote_token.token
-        self.logger.info(f"Base token: {base_token}")
-        self.logger.info(f"Quote token: {quote_token}")
-
-        market_metadata = None
-        for group_market in self.group.markets:
-            if group_market.base.token == base_token and group_market.quote.token == quote_token:
-                market_metadata = group_market
-                break
+        self.logger.info("Base token: %s", base_token)
+        self.logger.info("Quote token: %s", quote_token)
 
+        market_metadata = self.group.find_market_by_tokens(base_token, quote_token)
         if market_metadata is None:
             raise Exception(f"Market for '{base_token.name}/{quote_token.name}' not in group '{self.group.address}'.")
 
-        market = market_metadata.fetch_market(self.context)
-        self.logger.info(f"Market: {market_metadata.address} {market}")
+        market = self._get_market(market_metadata)
+        self.logger.info("Market: %s %s", market_metadata.address, market)
 
         return (market_metadata, base_token, quote_token)
 
@@ -228,8 +319,9 @@ if __name__ == "__main__":
     logging.getLogger().setLevel(logging.INFO)
 
     from Context import default_context
-    from Wallet import default_wallet
+    from Wallet import get_default_wallet
 
+    default_wallet = get_default_wallet()
     if default_wallet is None:
         print("No default wallet file available.")
     else:
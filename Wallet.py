@@ -1,6 +1,8 @@
+import functools
 import json
 import logging
 import os.path
+import typing
 
 from solana.account import Account
 from solana.publickey import PublicKey
@@ -12,29 +14,38 @@ _DEFAULT_WALLET_FILENAME: str = "id.json"
 class Wallet:
     def __init__(self, secret_key):
         self.logger: logging.Logger = logging.getLogger(self.__class__.__name__)
-        self.secret_key = secret_key[0:32]
-        self.account = Account(self.secret_key)
+        # Kept as a single immutable bytes buffer, shared with the Account rather than copied.
+        self._secret: bytes = bytes(secret_key[0:32])
+        self.account = Account(self._secret)
+        # Deriving the public key from the secret isn't free, and the account never changes.
+        self._address: PublicKey = self.account.public_key()
 
     @property
     def address(self) -> PublicKey:
-        return self.account.public_key()
+        return self._address
+
+    @property
+    def secret_key(self) -> bytes:
+        return self._secret
 
     def save(self, filename: str, overwrite: bool = False) -> None:
         if os.path.isfile(filename) and not overwrite:
             raise Exception(f"Wallet file '{filename}' already exists.")
 
         with open(filename, "w") as json_file:
-            json.dump(list(self.secret_key), json_file)
+            json.dump(list(self._secret), json_file)
 
     @staticmethod
     def load(filename: str = _DEFAULT_WALLET_FILENAME) -> "Wallet":
-        if not os.path.isfile(filename):
+        try:
+            json_file = open(filename)
+        except FileNotFoundError as exception:
             logging.error(f"Wallet file '{filename}' is not present.")
-            raise Exception(f"Wallet file '{filename}' is not present.")
-        else:
-            with open(filename) as json_file:
-                data = json.load(json_file)
-                return Wallet(data)
+            raise Exception(f"Wallet file '{filename}' is not present.") from exception
+
+        with json_file:
+            data = json.load(json_file)
+            return Wallet(data)
 
     @staticmethod
     def create() -> "Wallet":
@@ -43,13 +54,20 @@ class Wallet:
         return Wallet(new_secret_key)
 
 
-default_wallet = None
-if os.path.isfile(_DEFAULT_WALLET_FILENAME):
-     try:
-         default_wallet = Wallet.load(_DEFAULT_WALLET_FILENAME)
-     except Exception as exception:
-         logging.warning(
-             f"Failed to load default wallet from file '{_DEFAULT_WALLET_FILENAME}' - exception: {exception}")
+# Loaded on first use rather than at import, so importing this module doesn't read the wallet file
+# or derive a key when no wallet is needed.
+@functools.lru_cache(maxsize=None)
+def get_default_wallet() -> typing.Optional[Wallet]:
+    try:
+        with open(_DEFAULT_WALLET_FILENAME) as json_file:
+            return Wallet(json.load(json_file))
+    except FileNotFoundError:
+        return None
+    except Exception as exception:
+        logging.warning(
+            f"Failed to load default wallet from file '{_DEFAULT_WALLET_FILENAME}' - exception: {exception}")
+    return None
+
 if __name__ == "__main__":
     logging.getLogger().setLevel(logging.INFO)
 
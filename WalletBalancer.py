@@ -6,6 +6,7 @@ from decimal import Decimal
 from solana.publickey import PublicKey
 
 from baseCli import BasketToken, Group, Token, TokenValue
+from Constants import ZERO
 from Context import Context
 from TradeExecutor import TradeExecutor
 from Wallet import Wallet
@@ -81,29 +82,24 @@ def sort_changes_for_trades(changes: typing.List[TokenValue]) -> typing.List[Tok
     return sorted(changes, key=lambda change: change.value)
 
 def calculate_required_balance_changes(current_balances: typing.List[TokenValue], desired_balances: typing.List[TokenValue]) -> typing.List[TokenValue]:
-    changes: typing.List[TokenValue] = []
-    for desired in desired_balances:
-        current = TokenValue.find_by_token(current_balances, desired.token)
-        change = TokenValue(desired.token, desired.value - current.value)
-        changes += [change]
-
-    return changes
+    current_by_mint: typing.Dict[PublicKey, TokenValue] = {current.token.mint: current for current in current_balances}
+    return [TokenValue(desired.token, desired.value - current_by_mint[desired.token.mint].value) for desired in desired_balances]
 
 class FilterSmallChanges:
-    def __init__(self, action_threshold: Decimal, balances: typing.List[TokenValue], prices: typing.List[TokenValue]):
+    def __init__(self, action_threshold: Decimal, balances: typing.List[TokenValue], prices_by_mint: typing.Dict[PublicKey, TokenValue]):
         self.logger: logging.Logger = logging.getLogger(self.__class__.__name__)
-        self.prices: typing.Dict[str, TokenValue] = {}
-        total = Decimal(0)
+        # Keyed on the mint PublicKey itself - formatting it as a string would base58-encode it
+        # every time.
+        self.prices: typing.Dict[PublicKey, TokenValue] = prices_by_mint
+        total = ZERO
         for balance in balances:
-            price = TokenValue.find_by_token(prices, balance.token)
-            self.prices[f"{price.token.mint}"] = price
-            total += price.value * balance.value
+            total += prices_by_mint[balance.token.mint].value * balance.value
         self.total_balance = total
         self.action_threshold_value = total * action_threshold
         self.logger.info(f"Wallet total balance of {total} gives action threshold value of {self.action_threshold_value}")
 
     def allow(self, token_value: TokenValue) -> bool:
-        price = self.prices[f"{token_value.token.mint}"]
+        price = self.prices[token_value.token.mint]
         value = price.value * token_value.value
         absolute_value = value.copy_abs()
         result = absolute_value > self.action_threshold_value
@@ -134,25 +130,32 @@ class LiveWalletBalancer(WalletBalancer):
         padding = "\n    "
 
         def balances_report(balances) -> str:
-            return padding.join(list([f"{bal}" for bal in balances]))
+            return padding.join(f"{bal}" for bal in balances)
 
         current_balances = self._fetch_balances()
-        total_value = Decimal(0)
+        prices_by_mint: typing.Dict[PublicKey, TokenValue] = {price.token.mint: price for price in prices}
+        total_value = ZERO
         for bal in current_balances:
-            price = TokenValue.find_by_token(prices, bal.token)
+            price = prices_by_mint[bal.token.mint]
             value = bal.value * price.value
             total_value += value
         self.logger.info(f"Starting balances: {padding}{balances_report(current_balances)} - total: {total_value}")
-        resolved_targets: typing.List[TokenValue] = []
-        for target in self.target_balances:
-            price = TokenValue.find_by_token(prices, target.token)
-            resolved_targets += [target.resolve(price.value, total_value)]
+        # Targets can depend on the total value, so they're resolved once the total is known.
+        resolved_targets = [target.resolve(prices_by_mint[target.token.mint].value, total_value) for target in self.target_balances]
 
         balance_changes = calculate_required_balance_changes(current_balances, resolved_targets)
+        if all(change.value == 0 for change in balance_changes):
+            self.logger.info("No balance changes to make.")
+            return
+
         self.logger.info(f"Full balance changes: {padding}{balances_report(balance_changes)}")
 
-        dont_bother = FilterSmallChanges(self.action_threshold, current_balances, prices)
-        filtered_changes = list(filter(dont_bother.allow, balance_changes))
+        if self.action_threshold == 0:
+            # With no threshold the filter would only drop changes of zero.
+            filtered_changes = [change for change in balance_changes if change.value != 0]
+        else:
+            dont_bother = FilterSmallChanges(self.action_threshold, current_balances, prices_by_mint)
+            filtered_changes = [change for change in balance_changes if dont_bother.allow(change)]
         self.logger.info(f"Filtered balance changes: {padding}{balances_report(filtered_changes)}")
         if len(filtered_changes) == 0:
             self.logger.info("No balance changes to make.")
@@ -164,6 +167,9 @@ class LiveWalletBalancer(WalletBalancer):
         self.logger.info(f"Finishing balances: {padding}{balances_report(updated_balances)}")
 
     def _make_changes(self, balance_changes: typing.List[TokenValue]):
+        if len(balance_changes) == 0:
+            return
+
         self.logger.info(f"Balance changes to make: {balance_changes}")
         for change in balance_changes:
             if change.value < 0:
@@ -172,12 +178,12 @@ class LiveWalletBalancer(WalletBalancer):
                 self.trade_executor.buy(change.token.name, change.value.copy_abs())
 
     def _fetch_balances(self) -> typing.List[TokenValue]:
-        balances: typing.List[TokenValue] = []
-        for token in self.tokens:
-            balance = TokenValue.fetch_total_value(self.context, self.wallet.address, token)
-            balances += [balance]
+        try:
+            return TokenValue.fetch_total_values(self.context, self.wallet.address, self.tokens)
+        except Exception as exception:
+            self.logger.warning(f"Could not fetch all balances in one call, falling back to fetching them one at a time - {exception}")
 
-        return balances
+        return [TokenValue.fetch_total_value(self.context, self.wallet.address, token) for token in self.tokens]
 
 if __name__ == "__main__":
     logging.getLogger().setLevel(logging.INFO)
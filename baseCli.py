@@ -1,15 +1,22 @@
 import abc
+import atexit
+import concurrent.futures
 import datetime
 import enum
+import functools
 import logging
+import sys
+import threading
 import time
 import typing
 
-import aysncio
+import asyncio
 import Layout as layouts
 
 from decimal import Decimal
+from pyserum._layouts.market import MARKET_LAYOUT
 from pyserum.market import Market
+from pyserum.market.state import MarketState
 from pyserum.open_orders_account import OpenOrdersAccount
 from solana.account import Account
 from solana.publickey import PublicKey
@@ -18,11 +25,41 @@ from solana.rpc.types import MemcmpOpts, TokenAccountOpts, RPCMethod, RPCRespons
 from spl.token.client import Token as SplToken
 from spl.token.constants import TOKEN_PROGRAM_ID
 
-from Constants import NUM_MARKETS, NUM_TOKENS, SOL_DECIMALS, SYSTEM_PROGRAM_ADDRESS, MAX_RATE,OPTIMAL_RATE,OPTIMAL_UTIL
+from Constants import NUM_MARKETS, NUM_TOKENS, SOL_DECIMALS, SYSTEM_PROGRAM_ADDRESS, ZERO, MAX_RATE, OPTIMAL_RATE, OPTIMAL_UTIL, RATE_SLOPE_HIGH, RATE_SLOPE_LOW
 from Context import Context
 from Decoder import decode_binary, encode_binary, encode_key
 
 
+# construct's sizeof() walks the whole layout each time it's called, and these sizes are checked
+# for every account parsed, so they're worked out once here.
+_AGGREGATOR_SIZE = layouts.AGGREGATOR.sizeof()
+_GROUP_SIZE = layouts.GROUP.sizeof()
+_OPEN_ORDERS_SIZE = layouts.OPEN_ORDERS.sizeof()
+_MARGIN_ACCOUNT_SIZE = layouts.MARGIN_ACCOUNT.sizeof()
+_TOKEN_ACCOUNT_SIZE = layouts.TOKEN_ACCOUNT.sizeof()
+_SERUM_ACCOUNT_FLAGS_SIZE = layouts.SERUM_ACCOUNT_FLAGS.sizeof()
+_MANGO_ACCOUNT_FLAGS_SIZE = layouts.MANGO_ACCOUNT_FLAGS.sizeof()
+
+# Shared by everything here that makes several blocking requests at once, so threads are started
+# once rather than on every call. Work submitted to it mustn't itself wait on the pool.
+_IO_POOL = concurrent.futures.ThreadPoolExecutor(max_workers=32, thread_name_prefix="mango-io")
+atexit.register(_IO_POOL.shutdown)
+
+
+# Dividing by 10 ** decimals happens for every balance, index and price, but there are only a
+# handful of different decimals values, so the Decimal divisors are worked out once each.
+@functools.lru_cache(maxsize=32)
+def _divisor(decimals: int) -> Decimal:
+    return Decimal(10) ** int(decimals)
+
+
+# Account owners are nearly always one of a handful of program IDs, so there's no need to
+# base58-decode the same owner string again for every account in a response.
+@functools.lru_cache(maxsize=1024)
+def _pk_from_str(public_key: str) -> PublicKey:
+    return PublicKey(public_key)
+
+
 class Version(enum.Enum):
     UNSPECIFIED = 0
     V1 = 1
@@ -54,14 +91,26 @@ class InstructionType(enum.IntEnum):
         return self.name
 
 class AccountInfo:
-    def __init__(self, address: PublicKey, executable: bool, lamports: Decimal, owner: PublicKey, rent_epoch: Decimal, data: bytes):
-        self.logger: logging.Logger = logging.getLogger(self.__class__.__name__)
+    __slots__ = ("address", "executable", "lamports", "owner", "rent_epoch", "_data", "_encoded")
+    logger: typing.ClassVar[logging.Logger] = logging.getLogger(__qualname__)
+
+    def __init__(self, address: PublicKey, executable: bool, lamports: Decimal, owner: PublicKey, rent_epoch: Decimal, data: typing.Optional[bytes], encoded: typing.Optional[typing.List] = None):
         self.address: PublicKey = address
         self.executable: bool = executable
         self.lamports: Decimal = lamports
         self.owner: PublicKey = owner
         self.rent_epoch: Decimal = rent_epoch
-        self.data: bytes = data
+        self._data: typing.Optional[bytes] = data
+        self._encoded: typing.Optional[typing.List] = encoded
+
+    # Account data can be passed in still encoded, as it came from the node. It's only decoded (and
+    # decompressed, for base64+zstd) the first time something actually looks at it, so accounts
+    # that are only filtered on their metadata never pay for it.
+    @property
+    def data(self) -> bytes:
+        if self._data is None:
+            self._data = decode_binary(self._encoded)
+        return self._data
 
     def encoded_data(self) -> typing.List:
         return encode_binary(self.data)
@@ -78,8 +127,7 @@ class AccountInfo:
         return f"{self}"
 
     @staticmethod
-    async def load(context: Context, address: PublicKey) -> typing.Optional["AccountInfo"]:
-
+    def load(context: Context, address: PublicKey) -> typing.Optional["AccountInfo"]:
         response: RPCResponse = context.client.get_account_info(address)
         result = context.unwrap_or_raise_exception(response)
         if result["value"] is None:
@@ -89,20 +137,25 @@ class AccountInfo:
 
 
     @staticmethod
-    async def load_multiple(context: Context, addresses: typing.List[PublicKey]) -> typing.List["AccountInfo"]:
-        address_strings = list(map(PublicKey.__str__, addresses))
-        response = await context.client._provider.make_request(RPCMethod("getMultipleAccounts"), address_strings)
-        response_value_list = zip(response["result"]["value"], addresses)
-        return list(map(lambda pair: AccountInfo._from_response_values(pair[0], pair[1]), response_value_list))
+    async def load_async(context: Context, address: PublicKey) -> typing.Optional["AccountInfo"]:
+        # Goes through the context's AccountLoader, so loads awaited together share one request.
+        value = await context.account_loader.load(address)
+        if value is None:
+            return None
+        return AccountInfo._from_response_values(value, address)
+
+    @staticmethod
+    async def load_multiple(context: Context, addresses: typing.List[PublicKey]) -> typing.List[typing.Optional["AccountInfo"]]:
+        values = await context.get_multiple_accounts_async(addresses)
+        return [None if value is None else AccountInfo._from_response_values(value, address) for value, address in zip(values, addresses)]
 
     @staticmethod
     def _from_response_values(response_values: typing.Dict[str, typing.Any], address: PublicKey) -> "AccountInfo":
         executable = bool(response_values["executable"])
         lamports = Decimal(response_values["lamports"])
-        owner = PublicKey(response_values["owner"])
+        owner = _pk_from_str(response_values["owner"])
         rent_epoch = Decimal(response_values["rentEpoch"])
-        data = decode_binary(response_values["data"])
-        return AccountInfo(address, executable, lamports, owner, rent_epoch, data)
+        return AccountInfo(address, executable, lamports, owner, rent_epoch, None, response_values["data"])
 
     @staticmethod
     def from_response(response: RPCResponse, address: PublicKey) -> "AccountInfo":
@@ -121,9 +174,11 @@ class AddressableAccount(metaclass=abc.ABCMeta):
         return f"{self}"
 
 class SerumAccountFlags:
+    __slots__ = ("version", "initialized", "market", "open_orders", "request_queue", "event_queue", "bids", "asks", "disabled")
+    logger: typing.ClassVar[logging.Logger] = logging.getLogger(__qualname__)
+
     def __init__(self, version: Version, initialized: bool, market: bool, open_orders: bool,
                  request_queue: bool, event_queue: bool, bids: bool, asks: bool, disabled: bool):
-        self.logger: logging.Logger = logging.getLogger(self.__class__.__name__)
         self.version: Version = version
         self.initialized = initialized
         self.market = market
@@ -157,8 +212,10 @@ class SerumAccountFlags:
         return f"{self}"
 
 class MangoAccountFlags:
+    __slots__ = ("version", "initialized", "group", "margin_account", "srm_account")
+    logger: typing.ClassVar[logging.Logger] = logging.getLogger(__qualname__)
+
     def __init__(self, version: Version, initialized: bool, group: bool, margin_account: bool, srm_account: bool):
-        self.logger: logging.Logger = logging.getLogger(self.__class__.__name__)
         self.version: Version = version
         self.initialized = initialized
         self.group = group
@@ -183,8 +240,10 @@ class MangoAccountFlags:
         return f"{self}"
 
 class Index:
+    __slots__ = ("version", "last_update", "borrow", "deposit")
+    logger: typing.ClassVar[logging.Logger] = logging.getLogger(__qualname__)
+
     def __init__(self, version: Version, last_update: datetime.datetime, borrow: Decimal, deposit: Decimal):
-        self.logger: logging.Logger = logging.getLogger(self.__class__.__name__)
         self.version: Version = version
         self.last_update: datetime.datetime = last_update
         self.borrow: Decimal = borrow
@@ -192,8 +251,9 @@ class Index:
 
     @staticmethod
     def from_layout(layout: layouts.INDEX, decimals: Decimal) -> "Index":
-        borrow = layout.borrow / Decimal(10 ** decimals)
-        deposit = layout.deposit / Decimal(10 ** decimals)
+        divisor = _divisor(decimals)
+        borrow = layout.borrow / divisor
+        deposit = layout.deposit / divisor
         return Index(Version.UNSPECIFIED, layout.last_update, borrow, deposit)
 
     def __str__(self) -> str:
@@ -203,10 +263,12 @@ class Index:
         return f"{self}"
 
 class AggregatorConfig:
+    __slots__ = ("version", "description", "decimals", "restart_delay", "max_submissions", "min_submissions", "reward_amount", "reward_token_account", "_divisor")
+    logger: typing.ClassVar[logging.Logger] = logging.getLogger(__qualname__)
+
     def __init__(self, version: Version, description: str, decimals: Decimal, restart_delay: Decimal,
                  max_submissions: Decimal, min_submissions: Decimal, reward_amount: Decimal,
                  reward_token_account: PublicKey):
-        self.logger: logging.Logger = logging.getLogger(self.__class__.__name__)
         self.version: Version = version
         self.description: str = description
         self.decimals: Decimal = decimals
@@ -215,6 +277,7 @@ class AggregatorConfig:
         self.min_submissions: Decimal = min_submissions
         self.reward_amount: Decimal = reward_amount
         self.reward_token_account: PublicKey = reward_token_account
+        self._divisor: Decimal = _divisor(decimals)
 
     @staticmethod
     def from_layout(layout: layouts.AGGREGATOR_CONFIG) -> "AggregatorConfig":
@@ -229,8 +292,10 @@ class AggregatorConfig:
         return f"{self}"
 
 class Round:
+    __slots__ = ("version", "id", "created_at", "updated_at")
+    logger: typing.ClassVar[logging.Logger] = logging.getLogger(__qualname__)
+
     def __init__(self, version: Version, id: Decimal, created_at: datetime.datetime, updated_at: datetime.datetime):
-        self.logger: logging.Logger = logging.getLogger(self.__class__.__name__)
         self.version: Version = version
         self.id: Decimal = id
         self.created_at: datetime.datetime = created_at
@@ -247,8 +312,10 @@ class Round:
         return f"{self}"
 
 class Answer:
+    __slots__ = ("version", "round_id", "median", "created_at", "updated_at")
+    logger: typing.ClassVar[logging.Logger] = logging.getLogger(__qualname__)
+
     def __init__(self, version: Version, round_id: Decimal, median: Decimal, created_at: datetime.datetime, updated_at: datetime.datetime):
-        self.logger: logging.Logger = logging.getLogger(self.__class__.__name__)
         self.version: Version = version
         self.round_id: Decimal = round_id
         self.median: Decimal = median
@@ -282,7 +349,7 @@ class Aggregator(AddressableAccount):
 
     @property
     def price(self) -> Decimal:
-        return self.answer.median / (10 ** self.config.decimals)
+        return Decimal(self.answer.median) / self.config._divisor
 
     @staticmethod
     def from_layout(layout: layouts.AGGREGATOR, account_info: AccountInfo, name: str) -> "Aggregator":
@@ -296,12 +363,17 @@ class Aggregator(AddressableAccount):
 
     @staticmethod
     def parse(context: Context, account_info: AccountInfo) -> "Aggregator":
+        name = context.lookup_oracle_name(account_info.address)
+        return Aggregator.parse_with_name(context, account_info, name)
+
+    # For callers that already know the oracle's name (like Group, which looks them all up once).
+    @staticmethod
+    def parse_with_name(context: Context, account_info: AccountInfo, name: str) -> "Aggregator":
         data = account_info.data
-        if len(data) != layouts.AGGREGATOR.sizeof():
-            raise Exception(f"Data length ({len(data)}) does not match expected size ({layouts.AGGREGATOR.sizeof()})")
+        if len(data) != _AGGREGATOR_SIZE:
+            raise Exception(f"Data length ({len(data)}) does not match expected size ({_AGGREGATOR_SIZE})")
 
-        name = context.lookup_oracle_name(account_info.address)
-        layout = layouts.AGGREGATOR.parse(data)
+        layout = layouts.parse_aggregator(data)
         return Aggregator.from_layout(layout, account_info, name)
 
     @staticmethod
@@ -311,6 +383,13 @@ class Aggregator(AddressableAccount):
             raise Exception(f"Aggregator account not found at address '{account_address}'")
         return Aggregator.parse(context, account_info)
 
+    @staticmethod
+    async def load_async(context: Context, account_address: PublicKey) -> "Aggregator":
+        account_info = await AccountInfo.load_async(context, account_address)
+        if account_info is None:
+            raise Exception(f"Aggregator account not found at address '{account_address}'")
+        return Aggregator.parse(context, account_info)
+
     def __str__(self) -> str:
         return f"""
 « Aggregator '{self.name}' [{self.version}]:
@@ -327,16 +406,21 @@ class Aggregator(AddressableAccount):
 class Token:
     def __init__(self, name: str, mint: PublicKey, decimals: Decimal):
         self.logger: logging.Logger = logging.getLogger(self.__class__.__name__)
-        self.name: str = name.upper()
+        # Interned, so the many Tokens sharing a name share one string and compare by identity first.
+        self.name: str = sys.intern(name.upper())
         self.mint: PublicKey = mint
         self.decimals: Decimal = decimals
+        self._divisor: Decimal = _divisor(decimals)
+        # Comparing raw bytes is cheaper than PublicKey equality in the find_by_mint() scans.
+        self._mint_bytes: bytes = bytes(mint)
 
     def round(self, value: Decimal) -> Decimal:
         rounded = round(value, int(self.decimals))
         return Decimal(rounded)
 
     def name_matches(self, name: str) -> bool:
-        return self.name.upper() == name.upper()
+        # self.name is already upper-cased in __init__().
+        return self.name == name.upper()
 
     @staticmethod
     def find_by_name(values: typing.List["Token"], name: str) -> "Token":
@@ -351,7 +435,8 @@ class Token:
 
     @staticmethod
     def find_by_mint(values: typing.List["Token"], mint: PublicKey) -> "Token":
-        found = [value for value in values if value.mint == mint]
+        target = bytes(mint)
+        found = [value for value in values if value._mint_bytes == target]
         if len(found) == 0:
             raise Exception(f"Token '{mint}' not found in token values: {values}")
 
@@ -374,15 +459,33 @@ class Token:
 
 SolToken = Token("SOL", SYSTEM_PROGRAM_ADDRESS, SOL_DECIMALS)
 
+# Tokens already looked up by name, per cluster. Token lists don't change while the process runs,
+# so find_by_name() only pays for the lookup and Token construction once per name.
+_tokens_by_name: typing.Dict[typing.Tuple[str, str], Token] = {}
+
 class TokenLookup:
+    # Looks up several tokens at once, returning them by the names asked for.
+    @staticmethod
+    def preload(context: Context, names: typing.List[str]) -> typing.Dict[str, Token]:
+        return {name: TokenLookup.find_by_name(context, name) for name in names}
+
     @staticmethod
     def find_by_name(context: Context, name: str) -> Token:
+        key = (context.cluster, name)
+        token = _tokens_by_name.get(key)
+        if token is not None:
+            return token
+
         if SolToken.name_matches(name):
-            return SolToken
-        mint = context.lookup_token_address(name)
-        if mint is None:
-            raise Exception(f"Could not find token with name '{name}'.")
-        return Token(name, mint, Decimal(6))
+            token = SolToken
+        else:
+            mint = context.lookup_token_address(name)
+            if mint is None:
+                raise Exception(f"Could not find token with name '{name}'.")
+            token = Token(name, mint, Decimal(6))
+
+        _tokens_by_name[key] = token
+        return token
 
     @staticmethod
     def find_by_mint(context: Context, mint: PublicKey) -> Token:
@@ -394,8 +497,10 @@ class TokenLookup:
         return Token(name, mint, Decimal(6))
 
 class BasketToken:
+    __slots__ = ("token", "vault", "index")
+    logger: typing.ClassVar[logging.Logger] = logging.getLogger(__qualname__)
+
     def __init__(self, token: Token, vault: PublicKey, index: Index):
-        self.logger: logging.Logger = logging.getLogger(self.__class__.__name__)
         self.token: Token = token
         self.vault: PublicKey = vault
         self.index: Index = index
@@ -413,7 +518,8 @@ class BasketToken:
 
     @staticmethod
     def find_by_mint(values: typing.List["BasketToken"], mint: PublicKey) -> "BasketToken":
-        found = [value for value in values if value.token.mint == mint]
+        target = bytes(mint)
+        found = [value for value in values if value.token._mint_bytes == target]
         if len(found) == 0:
             raise Exception(f"Token '{mint}' not found in token values: {values}")
 
@@ -442,26 +548,27 @@ class BasketToken:
         return f"{self}"
 
 class TokenValue:
+    __slots__ = ("token", "value")
+
     def __init__(self, token: Token, value: Decimal):
         self.token = token
         self.value = value
 
     @staticmethod
-    async def fetch_total_value_or_none(context: Context, account_public_key: PublicKey, token: Token) -> typing.Optional["TokenValue"]:
-        opts = TokenAccountOpts(mint=token.mint)
-
-        token_accounts_response = await context.client.get_token_accounts_by_owner(account_public_key, opts, commitment=context.commitment)
-        token_accounts = token_accounts_response["result"]["value"]
+    def fetch_total_value_or_none(context: Context, account_public_key: PublicKey, token: Token) -> typing.Optional["TokenValue"]:
+        # With jsonParsed encoding the node includes each account's token amount, so there's no
+        # need for a getTokenAccountBalance call per account.
+        response = context.client._provider.make_request(RPCMethod("getTokenAccountsByOwner"), str(account_public_key),
+                                                         {"mint": str(token.mint)},
+                                                         {"encoding": "jsonParsed", "commitment": context.commitment})
+        token_accounts = context.unwrap_or_raise_exception(response)["value"]
         if len(token_accounts) == 0:
             return None
 
         total_value = Decimal(0)
         for token_account in token_accounts:
-            result = await context.client.get_token_account_balance(token_account["pubkey"], commitment=context.commitment)
-            value = Decimal(result["result"]["value"]["amount"])
-            decimal_places = result["result"]["value"]["decimals"]
-            divisor = Decimal(10 ** decimal_places)
-            total_value += value / divisor
+            amount = token_account["account"]["data"]["parsed"]["info"]["tokenAmount"]
+            total_value += Decimal(amount["amount"]) / _divisor(amount["decimals"])
 
         return TokenValue(token, total_value)
 
@@ -472,6 +579,25 @@ class TokenValue:
             return TokenValue(token, Decimal(0))
         return value
 
+    @staticmethod
+    def fetch_total_values(context: Context, account_public_key: PublicKey, tokens: typing.List[Token]) -> typing.List["TokenValue"]:
+        # Fetches every SPL token account the owner has in one getTokenAccountsByOwner call, with
+        # the balances already parsed by the node, instead of one or more calls per token. Results
+        # are in the same order as the tokens, with zero for tokens the owner has no accounts for.
+        response = context.client._provider.make_request(RPCMethod("getTokenAccountsByOwner"), str(account_public_key),
+                                                         {"programId": str(TOKEN_PROGRAM_ID)},
+                                                         {"encoding": "jsonParsed", "commitment": context.commitment})
+        token_accounts = context.unwrap_or_raise_exception(response)["value"]
+
+        totals_by_mint: typing.Dict[str, Decimal] = {}
+        for token_account in token_accounts:
+            info = token_account["account"]["data"]["parsed"]["info"]
+            amount = info["tokenAmount"]
+            value = Decimal(amount["amount"]).scaleb(-amount["decimals"])
+            totals_by_mint[info["mint"]] = totals_by_mint.get(info["mint"], Decimal(0)) + value
+
+        return [TokenValue(token, totals_by_mint.get(str(token.mint), Decimal(0))) for token in tokens]
+
     @staticmethod
     def report(reporter: typing.Callable[[str], None], values: typing.List["TokenValue"]) -> None:
         for value in values:
@@ -490,7 +616,8 @@ class TokenValue:
 
     @staticmethod
     def find_by_mint(values: typing.List["TokenValue"], mint: PublicKey) -> "TokenValue":
-        found = [value for value in values if value.token.mint == mint]
+        target = bytes(mint)
+        found = [value for value in values if value.token._mint_bytes == target]
         if len(found) == 0:
             raise Exception(f"Token '{mint}' not found in token values: {values}")
 
@@ -505,11 +632,15 @@ class TokenValue:
 
     @staticmethod
     def changes(before: typing.List["TokenValue"], after: typing.List["TokenValue"]) -> typing.List["TokenValue"]:
-        changes: typing.List[TokenValue] = []
-        for before_balance in before:
-            after_balance = TokenValue.find_by_token(after, before_balance.token)
+        # Index the 'after' values once rather than searching the whole list for every token.
+        after_by_mint: typing.Dict[PublicKey, TokenValue] = {value.token.mint: value for value in after}
+        changes: typing.List[TokenValue] = [None] * len(before)  # type: ignore
+        for index, before_balance in enumerate(before):
+            after_balance = after_by_mint.get(before_balance.token.mint)
+            if after_balance is None:
+                raise Exception(f"Token '{before_balance.token.mint}' not found in token values: {after}")
             result = TokenValue(before_balance.token, after_balance.value - before_balance.value)
-            changes += [result]
+            changes[index] = result
 
         return changes
 
@@ -520,6 +651,8 @@ class TokenValue:
         return f"{self}"
 
 class OwnedTokenValue:
+    __slots__ = ("owner", "token_value")
+
     def __init__(self, owner: PublicKey, token_value: TokenValue):
         self.owner = owner
         self.token_value = token_value
@@ -537,12 +670,16 @@ class OwnedTokenValue:
 
     @staticmethod
     def changes(before: typing.List["OwnedTokenValue"], after: typing.List["OwnedTokenValue"]) -> typing.List["OwnedTokenValue"]:
-        changes: typing.List[OwnedTokenValue] = []
-        for before_value in before:
-            after_value = OwnedTokenValue.find_by_owner(after, before_value.owner)
+        # Index the 'after' values once rather than searching the whole list for every owner.
+        after_by_owner: typing.Dict[PublicKey, OwnedTokenValue] = {value.owner: value for value in after}
+        changes: typing.List[OwnedTokenValue] = [None] * len(before)  # type: ignore
+        for index, before_value in enumerate(before):
+            after_value = after_by_owner.get(before_value.owner)
+            if after_value is None:
+                raise Exception(f"Owner '{before_value.owner}' not found in: {after}")
             token_value = TokenValue(before_value.token_value.token, after_value.token_value.value - before_value.token_value.value)
             result = OwnedTokenValue(before_value.owner, token_value)
-            changes += [result]
+            changes[index] = result
 
         return changes
 
@@ -553,9 +690,11 @@ class OwnedTokenValue:
         return f"{self}"
 
 class MarketMetadata:
+    __slots__ = ("name", "address", "base", "quote", "spot", "oracle", "decimals", "oracle_name", "_market", "_market_lock")
+    logger: typing.ClassVar[logging.Logger] = logging.getLogger(__qualname__)
+
     def __init__(self, name: str, address: PublicKey, base: BasketToken, quote: BasketToken,
-                 spot: PublicKey, oracle: PublicKey, decimals: Decimal):
-        self.logger: logging.Logger = logging.getLogger(self.__class__.__name__)
+                 spot: PublicKey, oracle: PublicKey, decimals: Decimal, oracle_name: str = "« Unknown Oracle »"):
         self.name: str = name
         self.address: PublicKey = address
         self.base: BasketToken = base
@@ -563,11 +702,27 @@ class MarketMetadata:
         self.spot: PublicKey = spot
         self.oracle: PublicKey = oracle
         self.decimals: Decimal = decimals
-        self._market = None
+        self.oracle_name: str = oracle_name
+        self._market: typing.Optional[Market] = None
+        self._market_lock: threading.Lock = threading.Lock()
+
+    def load_market(self, context: Context) -> Market:
+        # The lock stops concurrent callers each loading the same market.
+        with self._market_lock:
+            if self._market is None:
+                self._market = Market.load(context.client, self.spot)
+            return self._market
+
+    def set_market(self, market: Market) -> None:
+        with self._market_lock:
+            if self._market is None:
+                self._market = market
 
     async def fetch_market(self, context: Context) -> Market:
         if self._market is None:
-            self._market = await Market.load(context.client, self.spot)
+            # pyserum's Market.load() is blocking, so keep it off the event loop.
+            loop = asyncio.get_event_loop()
+            return await loop.run_in_executor(None, self.load_market, context)
 
         return self._market
 
@@ -581,6 +736,10 @@ class MarketMetadata:
     def __repr__(self) -> str:
         return f"{self}"
 
+GROUP_CACHE_TTL_SECONDS = 5
+
+_group_cache: typing.Dict[typing.Tuple[str, PublicKey], typing.Tuple[float, "Group"]] = {}
+
 class Group(AddressableAccount):
     def __init__(self, account_info: AccountInfo, version: Version, context: Context,
                  account_flags: MangoAccountFlags, basket_tokens: typing.List[BasketToken],
@@ -607,17 +766,48 @@ class Group(AddressableAccount):
         self.borrow_limits: typing.List[Decimal] = borrow_limits
         self.mint_decimals: typing.List[int] = [token.mint for token in basket_tokens]
 
+        # Indexes so that finding a token or market during a trade is a dict lookup, not a scan.
+        self._by_name: typing.Dict[str, BasketToken] = {basket_token.token.name: basket_token for basket_token in basket_tokens}
+        # Program-account filters on the group's address or signer key need them base58-encoded.
+        self._address_b58: str = encode_key(self.address)
+        self._signer_key_b58: str = encode_key(signer_key)
+
+        # OpenOrders accounts are parsed with these for every margin account, so they're
+        # gathered once rather than looked up through basket_tokens every time.
+        self._base_decimals: typing.Tuple[Decimal, ...] = tuple(basket_token.token.decimals for basket_token in basket_tokens)
+        self._quote_decimals: Decimal = basket_tokens[-1].token.decimals
+        self._token_index_by_mint: typing.Dict[bytes, int] = {
+            basket_token.token._mint_bytes: index for index, basket_token in enumerate(basket_tokens)
+        }
+        self._market_by_pair: typing.Dict[typing.Tuple[PublicKey, PublicKey], MarketMetadata] = {
+            (market.base.token.mint, market.quote.token.mint): market for market in markets
+        }
 
     @property
     def shared_quote_token(self) -> BasketToken:
         return self.basket_tokens[-1]
 
+    def find_basket_token_by_name(self, name: str) -> BasketToken:
+        basket_token = self._by_name.get(name.upper())
+        if basket_token is None:
+            return BasketToken.find_by_name(self.basket_tokens, name)
+        return basket_token
+
+    def find_market_by_tokens(self, base: Token, quote: Token) -> typing.Optional[MarketMetadata]:
+        market = self._market_by_pair.get((base.mint, quote.mint))
+        if market is None:
+            for group_market in self.markets:
+                if group_market.base.token == base and group_market.quote.token == quote:
+                    return group_market
+        return market
+
     @staticmethod
     def from_layout(layout: layouts.GROUP, context: Context, account_info: AccountInfo) -> "Group":
         account_flags = MangoAccountFlags.from_layout(layout.account_flags)
-        indexes = list(map(lambda pair: Index.from_layout(pair[0], pair[1]), zip(layout.indexes, layout.mint_decimals)))
+        indexes = [Index.from_layout(index, decimals) for index, decimals in zip(layout.indexes, layout.mint_decimals)]
 
-        basket_tokens: typing.List[BasketToken] = []
+        # The token and market counts are fixed, so both lists are allocated at full size up front.
+        basket_tokens: typing.List[BasketToken] = [None] * NUM_TOKENS  # type: ignore
         for index in range(NUM_TOKENS):
             token_address = layout.tokens[index]
             token_name = context.lookup_token_name(token_address)
@@ -625,20 +815,24 @@ class Group(AddressableAccount):
                 raise Exception(f"Could not find token with mint '{token_address}' in Group.")
             token = Token(token_name, token_address, layout.mint_decimals[index])
             basket_token = BasketToken(token, layout.vaults[index], indexes[index])
-            basket_tokens += [basket_token]
+            basket_tokens[index] = basket_token
 
-        markets: typing.List[MarketMetadata] = []
+        # Token names are unique in a group, so index them once rather than searching the basket
+        # twice for every market.
+        by_name: typing.Dict[str, BasketToken] = {basket_token.token.name: basket_token for basket_token in basket_tokens}
+        markets: typing.List[MarketMetadata] = [None] * NUM_MARKETS  # type: ignore
         for index in range(NUM_MARKETS):
             market_address = layout.spot_markets[index]
             market_name = context.lookup_market_name(market_address)
             base_name, quote_name = market_name.split("/")
-            base_token = BasketToken.find_by_name(basket_tokens, base_name)
-            quote_token = BasketToken.find_by_name(basket_tokens, quote_name)
+            base_token = by_name.get(base_name.upper()) or BasketToken.find_by_name(basket_tokens, base_name)
+            quote_token = by_name.get(quote_name.upper()) or BasketToken.find_by_name(basket_tokens, quote_name)
             market = MarketMetadata(market_name, market_address, base_token, quote_token,
                                     layout.spot_markets[index],
                                     layout.oracles[index],
-                                    layout.oracle_decimals[index])
-            markets += [market]
+                                    layout.oracle_decimals[index],
+                                    context.lookup_oracle_name(layout.oracles[index]))
+            markets[index] = market
 
         maint_coll_ratio = layout.maint_coll_ratio.quantize(Decimal('.01'))
         init_coll_ratio = layout.init_coll_ratio.quantize(Decimal('.01'))
@@ -650,51 +844,89 @@ class Group(AddressableAccount):
     @staticmethod
     def parse(context: Context, account_info: AccountInfo) -> "Group":
         data = account_info.data
-        if len(data) != layouts.GROUP.sizeof():
-            raise Exception(f"Data length ({len(data)}) does not match expected size ({layouts.GROUP.sizeof()})")
+        if len(data) != _GROUP_SIZE:
+            raise Exception(f"Data length ({len(data)}) does not match expected size ({_GROUP_SIZE})")
 
-        layout = layouts.GROUP.parse(data)
+        layout = layouts.parse_group(data)
         return Group.from_layout(layout, context, account_info)
 
     @staticmethod
-    def load(context: Context):
+    def load(context: Context, use_cache: bool = True) -> "Group":
+        # Several liquidations in the same sweep all want the group, so a short-lived cache
+        # saves reloading it for every one. Anything that knows the group has changed (like a
+        # confirmed liquidation) should call Group.invalidate_cache().
+        cache_key = (context.cluster, context.group_id)
+        if use_cache:
+            cached = _group_cache.get(cache_key)
+            if cached is not None and time.monotonic() - cached[0] < GROUP_CACHE_TTL_SECONDS:
+                return cached[1]
+
         account_info = AccountInfo.load(context, context.group_id)
         if account_info is None:
             raise Exception(f"Group account not found at address '{context.group_id}'")
-        return Group.parse(context, account_info)
+        group = Group.parse(context, account_info)
+        _group_cache[cache_key] = (time.monotonic(), group)
+        return group
+
+    @staticmethod
+    def invalidate_cache(context: Context) -> None:
+        _group_cache.pop((context.cluster, context.group_id), None)
     
-    #TODO Test this method, implement get_ui_total_borrow,get_ui_total_deposit
-    def get_deposit_rate(self,token_index: int):
+    # Rates are calculated with floats rather than Decimals - they're estimates, and float
+    # arithmetic is far cheaper.
+    def get_deposit_rate(self,token_index: int) -> float:
         borrow_rate = self.get_borrow_rate(token_index)
-        total_borrows = self.get_ui_total_borrow(token_index)
-        total_deposits = self.get_ui_total_deposit(token_index)
+        total_borrows = float(self.get_ui_total_borrow(token_index))
+        total_deposits = float(self.get_ui_total_deposit(token_index))
         
-        if total_deposits == 0 and total_borrows == 0: return 0
+        if total_deposits == 0 and total_borrows == 0: return 0.0
         elif total_deposits == 0: return MAX_RATE
         utilization = total_borrows / total_deposits
         return utilization * borrow_rate
     
-    #TODO Test this method, implement get_ui_total_borrow, get_ui_total_deposit
-    def get_borrow_rate(self,token_index: int):
-        total_borrows = self.get_ui_total_borrow(token_index)
-        total_deposits = self.get_ui_total_deposit(token_index)
+    def get_borrow_rate(self,token_index: int) -> float:
+        total_borrows = float(self.get_ui_total_borrow(token_index))
+        total_deposits = float(self.get_ui_total_deposit(token_index))
         
-        if total_deposits == 0 and total_borrows == 0: return 0
+        if total_deposits == 0 and total_borrows == 0: return 0.0
         if total_deposits <= total_borrows : return MAX_RATE
         utilization = total_borrows / total_deposits
         if utilization > OPTIMAL_UTIL:
-            extra_util = utilization - OPTIMAL_UTIL
-            slope = (MAX_RATE - OPTIMAL_RATE) / (1 - OPTIMAL_UTIL)
-            return OPTIMAL_RATE + slope * extra_util
+            return OPTIMAL_RATE + RATE_SLOPE_HIGH * (utilization - OPTIMAL_UTIL)
         else:
-            slope = OPTIMAL_RATE / OPTIMAL_UTIL
-            return slope * utilization
+            return RATE_SLOPE_LOW * utilization
+
+    def preload_markets(self) -> None:
+        # Market.load() costs three requests per market - the market itself and both mints (just
+        # to get their decimals). The group already knows the decimals, so all the market accounts
+        # can be fetched in one getMultipleAccounts call and the Markets built from those bytes.
+        to_load = [market for market in self.markets if market._market is None]
+        if len(to_load) == 0:
+            return
+
+        self._install_markets(to_load, self.context.get_multiple_accounts([market.spot for market in to_load]))
+
+    async def preload_markets_async(self) -> None:
+        # The same as preload_markets(), but without blocking the event loop while it waits for the
+        # node.
+        to_load = [market for market in self.markets if market._market is None]
+        if len(to_load) == 0:
+            return
+
+        self._install_markets(to_load, await self.context.get_multiple_accounts_async([market.spot for market in to_load]))
+
+    def _install_markets(self, to_load: typing.List[MarketMetadata], account_values: typing.List[typing.Optional[typing.Dict[str, typing.Any]]]) -> None:
+        for market_metadata, account_value in zip(to_load, account_values):
+            if account_value is None:
+                raise Exception(f"Market account not found at address '{market_metadata.spot}'")
+
+            parsed = MARKET_LAYOUT.parse(decode_binary(account_value["data"]))
+            state = MarketState(parsed, self.dex_program_id, int(market_metadata.base.token.decimals),
+                                int(market_metadata.quote.token.decimals))
+            market_metadata.set_market(Market(self.context.client, state))
 
     def get_token_index(self, token: Token) -> int:
-        for index, existing in enumerate(self.basket_tokens):
-            if existing.token == token:
-                return index
-        return -1
+        return self._token_index_by_mint.get(token._mint_bytes, -1)
 
     def get_prices(self) -> typing.List[TokenValue]:
         started_at = time.time()
@@ -702,31 +934,30 @@ class Group(AddressableAccount):
         # Note: we can just load the oracle data in a simpler way, with:
         #   oracles = map(lambda market: Aggregator.load(self.context, market.oracle), self.markets)
         # but that makes a network request for every oracle. We can reduce that to just one request
-        # if we use AccountInfo.load_multiple() and parse the data ourselves.
+        # if we use a single getMultipleAccounts call and parse the data ourselves.
         #
         # This seems to halve the time this function takes.
-        oracle_addresses = list([market.oracle for market in self.markets])
-        oracle_account_infos = AccountInfo.load_multiple(self.context, oracle_addresses)
-        oracles = map(lambda oracle_account_info: Aggregator.parse(self.context, oracle_account_info),
-                      oracle_account_infos)
-        prices = list(map(lambda oracle: oracle.price, oracles)) + [Decimal(1)]
-        token_prices = []
-        for index, price in enumerate(prices):
-            token_prices += [TokenValue(self.basket_tokens[index].token, price)]
+        oracle_values = self.context.get_multiple_accounts([market.oracle for market in self.markets])
+        prices: typing.List[Decimal] = []
+        for market, oracle_value in zip(self.markets, oracle_values):
+            if oracle_value is None:
+                raise Exception(f"Oracle account not found at address '{market.oracle}'")
+            oracle_account_info = AccountInfo._from_response_values(oracle_value, market.oracle)
+            prices.append(Aggregator.parse_with_name(self.context, oracle_account_info, market.oracle_name).price)
+        prices.append(Decimal(1))
+        token_prices = [TokenValue(basket_token.token, price) for basket_token, price in zip(self.basket_tokens, prices)]
 
         time_taken = time.time() - started_at
         self.logger.info(f"Faster fetching prices complete. Time taken: {time_taken:.2f} seconds.")
         return token_prices
 
     def fetch_balances(self, root_address: PublicKey) -> typing.List[TokenValue]:
-        balances: typing.List[TokenValue] = []
-        sol_balance = self.context.fetch_sol_balance(root_address)
-        balances += [TokenValue(SolToken, sol_balance)]
-
-        for basket_token in self.basket_tokens:
-            balance = TokenValue.fetch_total_value(self.context, root_address, basket_token.token)
-            balances += [balance]
-        return balances
+        # The SOL balance and the token balances are independent requests, so they're made at the
+        # same time. All the token balances come back from a single request.
+        tokens = [basket_token.token for basket_token in self.basket_tokens]
+        sol_balance = _IO_POOL.submit(self.context.fetch_sol_balance, root_address)
+        token_balances = _IO_POOL.submit(TokenValue.fetch_total_values, self.context, root_address, tokens)
+        return [TokenValue(SolToken, sol_balance.result())] + token_balances.result()
 
     def native_to_ui(self, amount, decimals) -> int:
         return amount / (10 ** decimals)
@@ -734,13 +965,13 @@ class Group(AddressableAccount):
     def ui_to_native(self, amount, decimals) -> int:
         return amount * (10 ** decimals)
 
-    def getUiTotalDeposit(self, tokenIndex: int) -> int:
-        return Group.ui_to_native(self.totalDeposits[tokenIndex] * self.indexes[tokenIndex].deposit, self.mint_decimals[tokenIndex])
-
-
-    def getUiTotalBorrow(self, tokenIndex: int) -> int:
-        return Group.native_to_ui(self.totalBorrows[tokenIndex] * self.indexes[tokenIndex].borrow, self.mint_decimals[tokenIndex])
+    # Totals are held in native units, scaled by the token's index. The indexes are already divided
+    # by 10^decimals for the token (see Index.from_layout()), so the product is in UI units.
+    def get_ui_total_deposit(self, token_index: int) -> Decimal:
+        return self.total_deposits[token_index] * self.basket_tokens[token_index].index.deposit
 
+    def get_ui_total_borrow(self, token_index: int) -> Decimal:
+        return self.total_borrows[token_index] * self.basket_tokens[token_index].index.borrow
 
     def __str__(self) -> str:
         total_deposits = "\n        ".join(map(str, self.total_deposits))
@@ -781,7 +1012,7 @@ class TokenAccount(AddressableAccount):
 
     @staticmethod
     def create(context: Context, account: Account, token: Token):
-        spl_token = await SplToken(context.client, token.mint, TOKEN_PROGRAM_ID, account)
+        spl_token = SplToken(context.client, token.mint, TOKEN_PROGRAM_ID, account)
         owner = account.public_key()
         new_account_address = spl_token.create_account(owner)
         return TokenAccount.load(context, new_account_address)
@@ -790,36 +1021,49 @@ class TokenAccount(AddressableAccount):
     def fetch_all_for_owner_and_token(context: Context, owner_public_key: PublicKey, token: Token) -> typing.List["TokenAccount"]:
         opts = TokenAccountOpts(mint=token.mint)
 
-        token_accounts_response = await context.client.get_token_accounts_by_owner(owner_public_key, opts, commitment=context.commitment)
+        token_accounts_response = context.client.get_token_accounts_by_owner(owner_public_key, opts, commitment=context.commitment)
+
+        return [TokenAccount.parse(AccountInfo._from_response_values(token_account_response["account"], PublicKey(token_account_response["pubkey"])))
+                for token_account_response in token_accounts_response["result"]["value"]]
 
-        all_accounts: typing.List[TokenAccount] = []
-        for token_account_response in token_accounts_response["result"]["value"]:
+    @staticmethod
+    def fetch_all_for_owner(context: Context, owner_public_key: PublicKey) -> typing.Dict[PublicKey, typing.List["TokenAccount"]]:
+        # All the owner's SPL token accounts, for every mint, from a single getTokenAccountsByOwner
+        # call - cheaper than one call per token when several tokens are needed.
+        opts = TokenAccountOpts(program_id=TOKEN_PROGRAM_ID)
+
+        token_accounts_response = context.client.get_token_accounts_by_owner(owner_public_key, opts, commitment=context.commitment)
+
+        accounts_by_mint: typing.Dict[PublicKey, typing.List[TokenAccount]] = {}
+        for token_account_response in context.unwrap_or_raise_exception(token_accounts_response)["value"]:
             account_info = AccountInfo._from_response_values(token_account_response["account"], PublicKey(token_account_response["pubkey"]))
             token_account = TokenAccount.parse(account_info)
-            all_accounts += [token_account]
+            accounts_by_mint.setdefault(token_account.mint, []).append(token_account)
 
-        return all_accounts
+        return accounts_by_mint
 
     @staticmethod
-    def fetch_largest_for_owner_and_token(context: Context, owner_public_key: PublicKey, token: Token) -> typing.Optional["TokenAccount"]:
-        all_accounts = TokenAccount.fetch_all_for_owner_and_token(context, owner_public_key, token)
-
+    def find_largest(token_accounts: typing.List["TokenAccount"]) -> typing.Optional["TokenAccount"]:
         largest_account: typing.Optional[TokenAccount] = None
-        for token_account in all_accounts:
+        for token_account in token_accounts:
             if largest_account is None or token_account.amount > largest_account.amount:
                 largest_account = token_account
 
         return largest_account
 
+    @staticmethod
+    def fetch_largest_for_owner_and_token(context: Context, owner_public_key: PublicKey, token: Token) -> typing.Optional["TokenAccount"]:
+        all_accounts = TokenAccount.fetch_all_for_owner_and_token(context, owner_public_key, token)
+        return TokenAccount.find_largest(all_accounts)
+
     @staticmethod
     def fetch_or_create_largest_for_owner_and_token(context: Context, account: Account, token: Token) -> "TokenAccount":
         all_accounts = TokenAccount.fetch_all_for_owner_and_token(context, account.public_key(), token)
+        return TokenAccount.find_largest_or_create(context, account, token, all_accounts)
 
-        largest_account: typing.Optional[TokenAccount] = None
-        for token_account in all_accounts:
-            if largest_account is None or token_account.amount > largest_account.amount:
-                largest_account = token_account
-
+    @staticmethod
+    def find_largest_or_create(context: Context, account: Account, token: Token, token_accounts: typing.List["TokenAccount"]) -> "TokenAccount":
+        largest_account = TokenAccount.find_largest(token_accounts)
         if largest_account is None:
             return TokenAccount.create(context, account, token)
 
@@ -832,16 +1076,16 @@ class TokenAccount(AddressableAccount):
     @staticmethod
     def parse(account_info: AccountInfo) -> "TokenAccount":
         data = account_info.data
-        if len(data) != layouts.TOKEN_ACCOUNT.sizeof():
-            raise Exception(f"Data length ({len(data)}) does not match expected size ({layouts.TOKEN_ACCOUNT.sizeof()})")
+        if len(data) != _TOKEN_ACCOUNT_SIZE:
+            raise Exception(f"Data length ({len(data)}) does not match expected size ({_TOKEN_ACCOUNT_SIZE})")
 
-        layout = layouts.TOKEN_ACCOUNT.parse(data)
+        layout = layouts.parse_token_account(data)
         return TokenAccount.from_layout(layout, account_info)
 
     @staticmethod
     def load(context: Context, address: PublicKey) -> typing.Optional["TokenAccount"]:
         account_info = AccountInfo.load(context, address)
-        if account_info is None or (len(account_info.data) != layouts.TOKEN_ACCOUNT.sizeof()):
+        if account_info is None or (len(account_info.data) != _TOKEN_ACCOUNT_SIZE):
             return None
         return TokenAccount.parse(account_info)
 
@@ -881,14 +1125,20 @@ class OpenOrders(AddressableAccount):
         account_flags = SerumAccountFlags.from_layout(layout.account_flags)
         program_id = account_info.owner
 
-        base_divisor = 10 ** base_decimals
-        quote_divisor = 10 ** quote_decimals
+        base_divisor = _divisor(base_decimals)
+        quote_divisor = _divisor(quote_decimals)
         base_token_free: Decimal = layout.base_token_free / base_divisor
         base_token_total: Decimal = layout.base_token_total / base_divisor
         quote_token_free: Decimal = layout.quote_token_free / quote_divisor
         quote_token_total: Decimal = layout.quote_token_total / quote_divisor
-        nonzero_orders: typing.List[Decimal] = list([order for order in layout.orders if order != 0])
-        nonzero_client_ids: typing.List[Decimal] = list([client_id for client_id in layout.client_ids if client_id != 0])
+        # Orders and client IDs are parallel arrays of the same length, so one pass collects both.
+        nonzero_orders: typing.List[Decimal] = []
+        nonzero_client_ids: typing.List[Decimal] = []
+        for order, client_id in zip(layout.orders, layout.client_ids):
+            if order:
+                nonzero_orders.append(order)
+            if client_id:
+                nonzero_client_ids.append(client_id)
 
         return OpenOrders(account_info, Version.UNSPECIFIED, program_id, account_flags, layout.market,
                           layout.owner, base_token_free, base_token_total, quote_token_free, quote_token_total,
@@ -898,25 +1148,24 @@ class OpenOrders(AddressableAccount):
     @staticmethod
     def parse(account_info: AccountInfo, base_decimals: Decimal, quote_decimals: Decimal) -> "OpenOrders":
         data = account_info.data
-        if len(data) != layouts.OPEN_ORDERS.sizeof():
-            raise Exception(f"Data length ({len(data)}) does not match expected size ({layouts.OPEN_ORDERS.sizeof()})")
+        if len(data) != _OPEN_ORDERS_SIZE:
+            raise Exception(f"Data length ({len(data)}) does not match expected size ({_OPEN_ORDERS_SIZE})")
 
-        layout = layouts.OPEN_ORDERS.parse(data)
+        layout = layouts.parse_open_orders(data)
         return OpenOrders.from_layout(layout, account_info, base_decimals, quote_decimals)
 
     @staticmethod
-    async def load_raw_open_orders_account_infos(context: Context, group: Group) -> typing.Dict[str, AccountInfo]:
+    def load_raw_open_orders_account_infos(context: Context, group: Group) -> typing.Dict[bytes, AccountInfo]:
         filters = [
             MemcmpOpts(
-                offset=layouts.SERUM_ACCOUNT_FLAGS.sizeof() + 37,
-                bytes=encode_key(group.signer_key)
+                offset=_SERUM_ACCOUNT_FLAGS_SIZE + 37,
+                bytes=group._signer_key_b58
             )
         ]
 
-        response = await context.client.get_program_accounts(group.dex_program_id, data_size=layouts.OPEN_ORDERS.sizeof(), memcmp_opts=filters, commitment=Single, encoding="base64")
-        account_infos = list(map(lambda pair: AccountInfo._from_response_values(pair[0], pair[1]), [(result["account"], PublicKey(result["pubkey"])) for result in response["result"]]))
-        account_infos_by_address = {key: value for key, value in [(str(account_info.address), account_info) for account_info in account_infos]}
-        return account_infos_by_address
+        response = context.client.get_program_accounts(group.dex_program_id, data_size=_OPEN_ORDERS_SIZE, memcmp_opts=filters, commitment=Single, encoding=context.encoding)
+        account_infos = (AccountInfo._from_response_values(result["account"], PublicKey(result["pubkey"])) for result in response["result"])
+        return {bytes(account_info.address): account_info for account_info in account_infos}
 
     @staticmethod
     def load(context: Context, address: PublicKey, base_decimals: Decimal, quote_decimals: Decimal) -> "OpenOrders":
@@ -926,21 +1175,21 @@ class OpenOrders(AddressableAccount):
         return OpenOrders.parse(open_orders_account, base_decimals, quote_decimals)
 
     @staticmethod
-    async def load_for_market_and_owner(context: Context, market: PublicKey, owner: PublicKey, program_id: PublicKey, base_decimals: Decimal, quote_decimals: Decimal):
+    def load_for_market_and_owner(context: Context, market: PublicKey, owner: PublicKey, program_id: PublicKey, base_decimals: Decimal, quote_decimals: Decimal) -> typing.List["OpenOrders"]:
         filters = [
             MemcmpOpts(
-                offset=layouts.SERUM_ACCOUNT_FLAGS.sizeof() + 5,
+                offset=_SERUM_ACCOUNT_FLAGS_SIZE + 5,
                 bytes=encode_key(market)
             ),
             MemcmpOpts(
-                offset=layouts.SERUM_ACCOUNT_FLAGS.sizeof() + 37,
+                offset=_SERUM_ACCOUNT_FLAGS_SIZE + 37,
                 bytes=encode_key(owner)
             )
         ]
 
-        response = await context.client.get_program_accounts(context.dex_program_id, data_size=layouts.OPEN_ORDERS.sizeof(), memcmp_opts=filters, commitment=Single, encoding="base64")
-        accounts = list(map(lambda pair: AccountInfo._from_response_values(pair[0], pair[1]), [(result["account"], PublicKey(result["pubkey"])) for result in response["result"]]))
-        return list(map(lambda acc: OpenOrders.parse(acc, base_decimals, quote_decimals), accounts))
+        response = context.client.get_program_accounts(program_id, data_size=_OPEN_ORDERS_SIZE, memcmp_opts=filters, commitment=Single, encoding=context.encoding)
+        return [OpenOrders.parse(AccountInfo._from_response_values(result["account"], PublicKey(result["pubkey"])), base_decimals, quote_decimals)
+                for result in response["result"]]
 
     def __str__(self) -> str:
         orders = ", ".join(map(str, self.orders)) or "None"
@@ -1001,6 +1250,30 @@ class BalanceSheet:
     def __repr__(self) -> str:
         return f"{self}"
 
+# The same data as a list of BalanceSheets, but held as one list per column. Totalling a margin
+# account only needs the columns, so this saves building a BalanceSheet for every token just to
+# add them up. BalanceSheets are built from it only when a caller asks for them.
+class BalanceSheetArrays(typing.NamedTuple):
+    tokens: typing.List[Token]
+    liabilities: typing.List[Decimal]
+    settled_assets: typing.List[Decimal]
+    unsettled_assets: typing.List[Decimal]
+
+    def to_balance_sheets(self) -> typing.List[BalanceSheet]:
+        return [BalanceSheet(token, liabilities, settled_assets, unsettled_assets)
+                for token, liabilities, settled_assets, unsettled_assets
+                in zip(self.tokens, self.liabilities, self.settled_assets, self.unsettled_assets)]
+
+# Used by MarginAccount.load_all_ripe(). Returns None for accounts with no collateral.
+def _compute_balance_sheet_and_balances(margin_account: "MarginAccount", group: "Group", prices: typing.List[TokenValue],
+                                        prices_by_mint: typing.Optional[typing.Dict[bytes, TokenValue]] = None) -> typing.Optional[typing.Tuple["BalanceSheet", typing.List[TokenValue]]]:
+    # The intrinsic sheets feed both the totals and the balances, so they're only worked out once.
+    intrinsic = margin_account.get_intrinsic_balance_sheet_arrays(group)
+    balance_sheet = margin_account.get_balance_sheet_totals(group, prices, prices_by_mint, intrinsic)
+    if balance_sheet.collateral_ratio <= 0:
+        return None
+    return balance_sheet, margin_account.get_intrinsic_balances(group, intrinsic)
+
 class MarginAccount(AddressableAccount):
     def __init__(self, account_info: AccountInfo, version: Version, account_flags: MangoAccountFlags,
                  mango_group: PublicKey, owner: PublicKey, deposits: typing.List[Decimal],
@@ -1018,24 +1291,18 @@ class MarginAccount(AddressableAccount):
     @staticmethod
     def from_layout(layout: layouts.MARGIN_ACCOUNT, account_info: AccountInfo) -> "MarginAccount":
         account_flags: MangoAccountFlags = MangoAccountFlags.from_layout(layout.account_flags)
-        deposits: typing.List[Decimal] = []
-        for index, deposit in enumerate(layout.deposits):
-            deposits += [deposit]
-
-        borrows: typing.List[Decimal] = []
-        for index, borrow in enumerate(layout.borrows):
-            borrows += [borrow]
-
+        deposits: typing.List[Decimal] = list(layout.deposits)
+        borrows: typing.List[Decimal] = list(layout.borrows)
         return MarginAccount(account_info, Version.UNSPECIFIED, account_flags, layout.mango_group,
                              layout.owner, deposits, borrows, list(layout.open_orders))
 
     @staticmethod
     def parse(account_info: AccountInfo) -> "MarginAccount":
         data = account_info.data
-        if len(data) != layouts.MARGIN_ACCOUNT.sizeof():
-            raise Exception(f"Data length ({len(data)}) does not match expected size ({layouts.MARGIN_ACCOUNT.sizeof()})")
+        if len(data) != _MARGIN_ACCOUNT_SIZE:
+            raise Exception(f"Data length ({len(data)}) does not match expected size ({_MARGIN_ACCOUNT_SIZE})")
 
-        layout = layouts.MARGIN_ACCOUNT.parse(data)
+        layout = layouts.parse_margin_account(data)
         return MarginAccount.from_layout(layout, account_info)
 
     @staticmethod
@@ -1053,18 +1320,15 @@ class MarginAccount(AddressableAccount):
     def load_all_for_group(context: Context, program_id: PublicKey, group: Group) -> typing.List["MarginAccount"]:
         filters = [
             MemcmpOpts(
-                offset=layouts.MANGO_ACCOUNT_FLAGS.sizeof(),  # mango_group is just after the MangoAccountFlags, which is the first entry
-                bytes=encode_key(group.address)
+                offset=_MANGO_ACCOUNT_FLAGS_SIZE,  # mango_group is just after the MangoAccountFlags, which is the first entry
+                bytes=group._address_b58
             )
         ]
-        response = context.client.get_program_accounts(program_id, data_size=layouts.MARGIN_ACCOUNT.sizeof(), memcmp_opts=filters, commitment=Single, encoding="base64")
-        margin_accounts = []
-        for margin_account_data in response["result"]:
-            address = PublicKey(margin_account_data["pubkey"])
-            account = AccountInfo._from_response_values(margin_account_data["account"], address)
-            margin_account = MarginAccount.parse(account)
-            margin_accounts += [margin_account]
-        return margin_accounts
+        response = context.client.get_program_accounts(program_id, data_size=_MARGIN_ACCOUNT_SIZE, memcmp_opts=filters, commitment=Single, encoding=context.encoding)
+        results = response["result"]
+
+        return [MarginAccount.parse(AccountInfo._from_response_values(margin_account_data["account"], PublicKey(margin_account_data["pubkey"])))
+                for margin_account_data in results]
 
     @staticmethod
     def load_all_for_group_with_open_orders(context: Context, program_id: PublicKey, group: Group) -> typing.List["MarginAccount"]:
@@ -1080,12 +1344,12 @@ class MarginAccount(AddressableAccount):
         if group is None:
             group = Group.load(context)
 
-        mango_group_offset = layouts.MANGO_ACCOUNT_FLAGS.sizeof()  # mango_group is just after the MangoAccountFlags, which is the first entry.
+        mango_group_offset = _MANGO_ACCOUNT_FLAGS_SIZE  # mango_group is just after the MangoAccountFlags, which is the first entry.
         owner_offset = mango_group_offset + 32  # owner is just after mango_group in the layout, and it's a PublicKey which is 32 bytes.
         filters = [
             MemcmpOpts(
                 offset=mango_group_offset,
-                bytes=encode_key(group.address)
+                bytes=group._address_b58
             ),
             MemcmpOpts(
                 offset=owner_offset,
@@ -1093,16 +1357,27 @@ class MarginAccount(AddressableAccount):
             )
         ]
 
-        response = context.client.get_program_accounts(context.program_id, data_size=layouts.MARGIN_ACCOUNT.sizeof(), memcmp_opts=filters, commitment=Single, encoding="base64")
-        margin_accounts = []
-        for margin_account_data in response["result"]:
-            address = PublicKey(margin_account_data["pubkey"])
-            account = AccountInfo._from_response_values(margin_account_data["account"], address)
-            margin_account = MarginAccount.parse(account)
-            margin_account.load_open_orders_accounts(context, group)
-            margin_accounts += [margin_account]
+        response = context.client.get_program_accounts(context.program_id, data_size=_MARGIN_ACCOUNT_SIZE, memcmp_opts=filters, commitment=Single, encoding=context.encoding)
+        margin_accounts = [MarginAccount.parse(AccountInfo._from_response_values(margin_account_data["account"], PublicKey(margin_account_data["pubkey"])))
+                           for margin_account_data in response["result"]]
+        MarginAccount.load_open_orders_accounts_for_all(context, group, margin_accounts)
         return margin_accounts
 
+    @staticmethod
+    def load_open_orders_accounts_for_all(context: Context, group: Group, margin_accounts: typing.List["MarginAccount"]) -> None:
+        # Fetches every OpenOrders account used by any of the margin accounts with getMultipleAccounts
+        # (chunked into a single batch if there are a lot), rather than one request per account.
+        addresses = list({bytes(oo): oo for margin_account in margin_accounts
+                          for oo in margin_account.open_orders if oo != SYSTEM_PROGRAM_ADDRESS}.values())
+        if len(addresses) == 0:
+            return
+
+        account_values = context.get_multiple_accounts(addresses)
+        open_orders_by_address = {bytes(address): AccountInfo._from_response_values(value, address)
+                                  for address, value in zip(addresses, account_values) if value is not None}
+        for margin_account in margin_accounts:
+            margin_account.install_open_orders_accounts(group, open_orders_by_address)
+
     @classmethod
     def load_all_ripe(cls, context: Context) -> typing.List["MarginAccount"]:
         logger: logging.Logger = logging.getLogger(cls.__name__)
@@ -1114,16 +1389,16 @@ class MarginAccount(AddressableAccount):
         logger.info(f"Fetched {len(margin_accounts)} margin accounts to process.")
 
         prices = group.get_prices()
-        nonzero: typing.List[MarginAccountMetadata] = []
-        for margin_account in margin_accounts:
-            balance_sheet = margin_account.get_balance_sheet_totals(group, prices)
-            if balance_sheet.collateral_ratio > 0:
-                balances = margin_account.get_intrinsic_balances(group)
-                nonzero += [MarginAccountMetadata(margin_account, balance_sheet, balances)]
+        prices_by_mint = MarginAccount.index_prices(prices)
+
+        results = [_compute_balance_sheet_and_balances(margin_account, group, prices, prices_by_mint) for margin_account in margin_accounts]
+
+        nonzero: typing.List[MarginAccountMetadata] = [MarginAccountMetadata(margin_account, result[0], result[1])
+                                                       for margin_account, result in zip(margin_accounts, results)
+                                                       if result is not None]
         logger.info(f"Of those {len(margin_accounts)}, {len(nonzero)} have a nonzero collateral ratio.")
 
-        ripe_metadata = filter(lambda mam: mam.balance_sheet.collateral_ratio <= group.init_coll_ratio, nonzero)
-        ripe_accounts = list(map(lambda mam: mam.margin_account, ripe_metadata))
+        ripe_accounts = [mam.margin_account for mam in nonzero if mam.balance_sheet.collateral_ratio <= group.init_coll_ratio]
         logger.info(f"Of those {len(nonzero)}, {len(ripe_accounts)} are ripe 🥭.")
 
         time_taken = time.time() - started_at
@@ -1131,88 +1406,108 @@ class MarginAccount(AddressableAccount):
         return ripe_accounts
 
     def load_open_orders_accounts(self, context: Context, group: Group) -> None:
+        # Each OpenOrders account is a separate request, so they're all made at the same time.
+        tasks = [(index, oo) for index, oo in enumerate(self.open_orders) if oo != SYSTEM_PROGRAM_ADDRESS]
+        if len(tasks) == 0:
+            return
+
+        futures = {_IO_POOL.submit(OpenOrders.load, context, oo, group._base_decimals[index], group._quote_decimals): index
+                   for index, oo in tasks}
+        for future in concurrent.futures.as_completed(futures):
+            self.open_orders_accounts[futures[future]] = future.result()
+
+    # The OpenOrders AccountInfos are keyed by the raw bytes of their address - the same lookup as
+    # by str() but without base58-encoding every slot of every margin account.
+    def install_open_orders_accounts(self, group: Group, all_open_orders_by_address: typing.Dict[bytes, AccountInfo]) -> None:
         for index, oo in enumerate(self.open_orders):
-            key = oo
-            if key != SYSTEM_PROGRAM_ADDRESS:
-                self.open_orders_accounts[index] = OpenOrders.load(context, key, group.basket_tokens[index].token.decimals, group.shared_quote_token.token.decimals)
-
-    def install_open_orders_accounts(self, group: Group, all_open_orders_by_address: typing.Dict[str, AccountInfo]) -> None:
-        for index, oo in enumerate(self.open_orders):
-            key = str(oo)
-            if key in all_open_orders_by_address:
-                open_orders_account_info = all_open_orders_by_address[key]
-                open_orders = OpenOrders.parse(open_orders_account_info,
-                                               group.basket_tokens[index].token.decimals,
-                                               group.shared_quote_token.token.decimals)
+            open_orders_account_info = all_open_orders_by_address.get(bytes(oo))
+            if open_orders_account_info is not None:
+                open_orders = OpenOrders.parse(open_orders_account_info, group._base_decimals[index], group._quote_decimals)
                 self.open_orders_accounts[index] = open_orders
 
-    def get_intrinsic_balance_sheets(self, group: Group) -> typing.List[BalanceSheet]:
-        settled_assets: typing.List[Decimal] = [Decimal(0)] * NUM_TOKENS
-        liabilities: typing.List[Decimal] = [Decimal(0)] * NUM_TOKENS
-        for index in range(NUM_TOKENS):
-            settled_assets[index] = group.basket_tokens[index].index.deposit * self.deposits[index]
-            liabilities[index] = group.basket_tokens[index].index.borrow * self.borrows[index]
-
-        unsettled_assets: typing.List[Decimal] = [Decimal(0)] * NUM_TOKENS
-        for index in range(NUM_MARKETS):
-            open_orders_account = self.open_orders_accounts[index]
+    def get_intrinsic_balance_sheet_arrays(self, group: Group) -> BalanceSheetArrays:
+        liabilities = [basket_token.index.borrow * borrow for basket_token, borrow in zip(group.basket_tokens, self.borrows)]
+        settled_assets = [basket_token.index.deposit * deposit for basket_token, deposit in zip(group.basket_tokens, self.deposits)]
+        unsettled_assets: typing.List[Decimal] = [ZERO] * NUM_TOKENS
+        for index, open_orders_account in enumerate(self.open_orders_accounts):
             if open_orders_account is not None:
                 unsettled_assets[index] += open_orders_account.base_token_total
                 unsettled_assets[NUM_TOKENS - 1] += open_orders_account.quote_token_total
 
-        balance_sheets: typing.List[BalanceSheet] = []
-        for index in range(NUM_TOKENS):
-            balance_sheets += [BalanceSheet(group.basket_tokens[index].token, liabilities[index],
-                                            settled_assets[index], unsettled_assets[index])]
-
-        return balance_sheets
-
-    def get_priced_balance_sheets(self, group: Group, prices: typing.List[TokenValue]) -> typing.List[BalanceSheet]:
-        priced: typing.List[BalanceSheet] = []
-        balance_sheets = self.get_intrinsic_balance_sheets(group)
-        for balance_sheet in balance_sheets:
-            price = TokenValue.find_by_token(prices, balance_sheet.token)
-            liabilities = balance_sheet.liabilities * price.value
-            settled_assets = balance_sheet.settled_assets * price.value
-            unsettled_assets = balance_sheet.unsettled_assets * price.value
-            priced += [BalanceSheet(
-                price.token,
-                price.token.round(liabilities),
-                price.token.round(settled_assets),
-                price.token.round(unsettled_assets)
-            )]
-
-        return priced
-
-    def get_balance_sheet_totals(self, group: Group, prices: typing.List[TokenValue]) -> BalanceSheet:
-        liabilities = Decimal(0)
-        settled_assets = Decimal(0)
-        unsettled_assets = Decimal(0)
-
-        balance_sheets = self.get_priced_balance_sheets(group, prices)
-        for balance_sheet in balance_sheets:
-            if balance_sheet is not None:
-                liabilities += balance_sheet.liabilities
-                settled_assets += balance_sheet.settled_assets
-                unsettled_assets += balance_sheet.unsettled_assets
+        return BalanceSheetArrays([basket_token.token for basket_token in group.basket_tokens], liabilities, settled_assets, unsettled_assets)
+
+    def get_intrinsic_balance_sheets(self, group: Group) -> typing.List[BalanceSheet]:
+        return self.get_intrinsic_balance_sheet_arrays(group).to_balance_sheets()
 
+    # Callers pricing many accounts against the same prices can build this once and pass it to
+    # get_priced_balance_sheets() and get_balance_sheet_totals().
+    @staticmethod
+    def index_prices(prices: typing.List[TokenValue]) -> typing.Dict[bytes, TokenValue]:
+        return {price.token._mint_bytes: price for price in prices}
+
+    # The optional intrinsic arrays let callers that also want intrinsic balances (like
+    # load_all_ripe()) compute them once and use them for both.
+    def get_priced_balance_sheet_arrays(self, group: Group, prices: typing.List[TokenValue],
+                                        prices_by_mint: typing.Optional[typing.Dict[bytes, TokenValue]] = None,
+                                        intrinsic: typing.Optional[BalanceSheetArrays] = None) -> BalanceSheetArrays:
+        if intrinsic is None:
+            intrinsic = self.get_intrinsic_balance_sheet_arrays(group)
+        if prices_by_mint is None:
+            prices_by_mint = MarginAccount.index_prices(prices)
+
+        token_prices: typing.List[TokenValue] = []
+        for token in intrinsic.tokens:
+            price = prices_by_mint.get(token._mint_bytes)
+            if price is None:
+                price = TokenValue.find_by_token(prices, token)
+            token_prices.append(price)
+
+        return BalanceSheetArrays(
+            [price.token for price in token_prices],
+            [price.token.round(value * price.value) for price, value in zip(token_prices, intrinsic.liabilities)],
+            [price.token.round(value * price.value) for price, value in zip(token_prices, intrinsic.settled_assets)],
+            [price.token.round(value * price.value) for price, value in zip(token_prices, intrinsic.unsettled_assets)]
+        )
+
+    def get_priced_balance_sheets(self, group: Group, prices: typing.List[TokenValue],
+                                  prices_by_mint: typing.Optional[typing.Dict[bytes, TokenValue]] = None) -> typing.List[BalanceSheet]:
+        return self.get_priced_balance_sheet_arrays(group, prices, prices_by_mint).to_balance_sheets()
+
+    def get_balance_sheet_totals(self, group: Group, prices: typing.List[TokenValue],
+                                 prices_by_mint: typing.Optional[typing.Dict[bytes, TokenValue]] = None,
+                                 intrinsic: typing.Optional[BalanceSheetArrays] = None) -> BalanceSheet:
         # A BalanceSheet must have a token - it's a pain to make it a typing.Optional[Token].
         # So in this one case, we produce a 'fake' token whose symbol is a summary of all token
         # symbols that went into it.
         #
         # If this becomes more painful than typing.Optional[Token], we can go with making
         # Token optional.
-        summary_name = "-".join([bal.token.name for bal in balance_sheets])
+
+        # Most margin accounts in a group are empty, and an empty account's totals are all zero
+        # whatever the prices, so there's no need to price every token to find that out.
+        if not any(self.deposits) and not any(self.borrows) and all(oo is None for oo in self.open_orders_accounts):
+            summary_name = "-".join([basket_token.token.name for basket_token in group.basket_tokens])
+            summary_token = Token(summary_name, SYSTEM_PROGRAM_ADDRESS, Decimal(0))
+            return BalanceSheet(summary_token, ZERO, ZERO, ZERO)
+
+        priced = self.get_priced_balance_sheet_arrays(group, prices, prices_by_mint, intrinsic)
+        liabilities = sum(priced.liabilities, ZERO)
+        settled_assets = sum(priced.settled_assets, ZERO)
+        unsettled_assets = sum(priced.unsettled_assets, ZERO)
+
+        summary_name = "-".join([token.name for token in priced.tokens])
         summary_token = Token(summary_name, SYSTEM_PROGRAM_ADDRESS, Decimal(0))
         return BalanceSheet(summary_token, liabilities, settled_assets, unsettled_assets)
 
-    def get_intrinsic_balances(self, group: Group) -> typing.List[TokenValue]:
-        balance_sheets = self.get_intrinsic_balance_sheets(group)
+    def get_intrinsic_balances(self, group: Group, intrinsic: typing.Optional[BalanceSheetArrays] = None) -> typing.List[TokenValue]:
+        if intrinsic is None:
+            intrinsic = self.get_intrinsic_balance_sheet_arrays(group)
+        balance_sheets = intrinsic.to_balance_sheets()
         balances: typing.List[TokenValue] = []
         for index, balance_sheet in enumerate(balance_sheets):
             if balance_sheet.token is None:
                 raise Exception(f"Intrinsic balance sheet with index [{index}] has no token.")
-            balances += [TokenValue(balance_sheet.token, balance_sheet.value)]
+            balances.append(TokenValue(balance_sheet.token, balance_sheet.value))
 
         return balances
 
@@ -1252,7 +1547,60 @@ class MarginAccountMetadata:
     def collateral_ratio(self):
         return self.balance_sheet.collateral_ratio
 
+class MarginAccountTable:
+    # The numbers from a list of margin accounts, held column-by-column (one list per token, one
+    # entry per account) rather than account-by-account. Working out totals for every account on
+    # every price update then becomes a few tight loops down each column, with the per-token price
+    # and index looked up once instead of once per account.
+    def __init__(self, margin_accounts: typing.List["MarginAccount"], deposits: typing.List[typing.List[Decimal]],
+                 borrows: typing.List[typing.List[Decimal]], unsettled: typing.List[typing.List[Decimal]]):
+        self.margin_accounts: typing.List[MarginAccount] = margin_accounts
+        self.deposits: typing.List[typing.List[Decimal]] = deposits
+        self.borrows: typing.List[typing.List[Decimal]] = borrows
+        self.unsettled: typing.List[typing.List[Decimal]] = unsettled
+
+    @staticmethod
+    def from_margin_accounts(margin_accounts: typing.List["MarginAccount"]) -> "MarginAccountTable":
+        deposits = [[margin_account.deposits[index] for margin_account in margin_accounts] for index in range(NUM_TOKENS)]
+        borrows = [[margin_account.borrows[index] for margin_account in margin_accounts] for index in range(NUM_TOKENS)]
+        unsettled = [[Decimal(0)] * len(margin_accounts) for _ in range(NUM_TOKENS)]
+        for row, margin_account in enumerate(margin_accounts):
+            for index in range(NUM_MARKETS):
+                open_orders_account = margin_account.open_orders_accounts[index]
+                if open_orders_account is not None:
+                    unsettled[index][row] += open_orders_account.base_token_total
+                    unsettled[NUM_TOKENS - 1][row] += open_orders_account.quote_token_total
+
+        return MarginAccountTable(margin_accounts, deposits, borrows, unsettled)
+
+    # Returns the total (assets, liabilities) of every account, in the same order as the accounts.
+    # These are the same numbers MarginAccount.get_balance_sheet_totals() would give.
+    def get_balance_sheet_totals(self, group: Group, prices: typing.List[TokenValue]) -> typing.Tuple[typing.List[Decimal], typing.List[Decimal]]:
+        count = len(self.margin_accounts)
+        liabilities = [Decimal(0)] * count
+        settled_assets = [Decimal(0)] * count
+        unsettled_assets = [Decimal(0)] * count
+        for index in range(NUM_TOKENS):
+            basket_token = group.basket_tokens[index]
+            price = TokenValue.find_by_token(prices, basket_token.token)
+            price_value = price.value
+            round_value = price.token.round
+            deposit_index = basket_token.index.deposit
+            borrow_index = basket_token.index.borrow
+            deposits = self.deposits[index]
+            borrows = self.borrows[index]
+            unsettled = self.unsettled[index]
+            for row in range(count):
+                liabilities[row] += round_value(borrow_index * borrows[row] * price_value)
+                settled_assets[row] += round_value(deposit_index * deposits[row] * price_value)
+                unsettled_assets[row] += round_value(unsettled[row] * price_value)
+
+        assets = [settled + unsettled for settled, unsettled in zip(settled_assets, unsettled_assets)]
+        return assets, liabilities
+
 class LiquidationEvent:
+    __slots__ = ("timestamp", "signature", "wallet_address", "margin_account_address", "balances_before", "balances_after", "_changes", "_str")
+
     def __init__(self, timestamp: datetime.datetime, signature: str, wallet_address: PublicKey, margin_account_address: PublicKey, balances_before: typing.List[TokenValue], balances_after: typing.List[TokenValue]):
         self.timestamp = timestamp
         self.signature = signature
@@ -1260,10 +1608,40 @@ class LiquidationEvent:
         self.margin_account_address = margin_account_address
         self.balances_before = balances_before
         self.balances_after = balances_after
+        self._changes: typing.Optional[typing.List[TokenValue]] = None
+        self._str: typing.Optional[str] = None
+
+    # The per-token difference between the before and after balances, worked out on first use
+    # and then kept, since the balances don't change once the event is created.
+    @property
+    def changes(self) -> typing.List[TokenValue]:
+        if self._changes is None:
+            self._changes = TokenValue.changes(self.balances_before, self.balances_after)
+        return self._changes
+
+    # Totals the balance changes of many liquidations per token, in the order each token is first seen.
+    @staticmethod
+    def aggregate_changes(events: typing.Iterable["LiquidationEvent"]) -> typing.List[TokenValue]:
+        tokens: typing.Dict[bytes, Token] = {}
+        totals: typing.Dict[bytes, Decimal] = {}
+        for event in events:
+            for change in event.changes:
+                key = change.token._mint_bytes
+                if key in totals:
+                    totals[key] += change.value
+                else:
+                    tokens[key] = change.token
+                    totals[key] = change.value
+        return [TokenValue(tokens[key], total) for key, total in totals.items()]
 
     def __str__(self) -> str:
-        changes = TokenValue.changes(self.balances_before, self.balances_after)
-        changes_text = "\n        ".join([f"{change.value:>15,.8f} {change.token.name}" for change in changes])
+        # Events are often logged to several places, and nothing in them changes once created.
+        if self._str is None:
+            self._str = self._build_str()
+        return self._str
+
+    def _build_str(self) -> str:
+        changes_text = "\n        ".join([f"{change.value:>15,.8f} {change.token.name}" for change in self.changes])
         return f"""« 🥭 Liqudation Event 💧 at {self.timestamp}
             📇 Signature: {self.signature}
             👛 Wallet: {self.wallet_address}
@@ -1275,6 +1653,13 @@ class LiquidationEvent:
     def __repr__(self) -> str:
         return f"{self}"
 
+# Amounts used by the demo liquidation balances, parsed once rather than on every run.
+_D_ONE = Decimal(1)
+_D_POINT_ONE = Decimal("0.1")
+_D_THOUSAND = Decimal(1000)
+_D_POINT_ZERO_FIVE = Decimal("0.05")
+_D_TWO_THOUSAND = Decimal(2000)
+
 def _notebook_tests():
     log_level = logging.getLogger().level
     try:
@@ -1283,15 +1668,16 @@ def _notebook_tests():
         from Constants import SYSTEM_PROGRAM_ADDRESS
         from Context import default_context
 
+        tokens = TokenLookup.preload(default_context, ["ETH", "BTC", "USDT"])
         balances_before = [
-            TokenValue(TokenLookup.find_by_name(default_context, "ETH"), Decimal(1)),
-            TokenValue(TokenLookup.find_by_name(default_context, "BTC"), Decimal("0.1")),
-            TokenValue(TokenLookup.find_by_name(default_context, "USDT"), Decimal(1000))
+            TokenValue(tokens["ETH"], _D_ONE),
+            TokenValue(tokens["BTC"], _D_POINT_ONE),
+            TokenValue(tokens["USDT"], _D_THOUSAND)
         ]
         balances_after = [
-            TokenValue(TokenLookup.find_by_name(default_context, "ETH"), Decimal(1)),
-            TokenValue(TokenLookup.find_by_name(default_context, "BTC"), Decimal("0.05")),
-            TokenValue(TokenLookup.find_by_name(default_context, "USDT"), Decimal(2000))
+            TokenValue(tokens["ETH"], _D_ONE),
+            TokenValue(tokens["BTC"], _D_POINT_ZERO_FIVE),
+            TokenValue(tokens["USDT"], _D_TWO_THOUSAND)
         ]
         timestamp = datetime.datetime(2021, 5, 17, 12, 20, 56)
         event = LiquidationEvent(timestamp, "signature", SYSTEM_PROGRAM_ADDRESS, SYSTEM_PROGRAM_ADDRESS,
@@ -1335,23 +1721,25 @@ if __name__ == "__main__":
     # USDT
     print(TokenLookup.find_by_mint(default_context, PublicKey("Es9vMFrzaCERmJfrF4H2FYD4KCoNkY11McCe8BenwNYB")))
 
-    single_account_info = AccountInfo.load(default_context, default_context.dex_program_id)
+    # One getMultipleAccounts call covers both the single and the multiple account demos.
+    multiple_account_info = asyncio.run(AccountInfo.load_multiple(default_context, [default_context.program_id, default_context.dex_program_id]))
+    single_account_info = multiple_account_info[1]
     print("DEX account info", single_account_info)
-
-    multiple_account_info = AccountInfo.load_multiple(default_context, [default_context.program_id, default_context.dex_program_id])
     print("Mango program and DEX account info", multiple_account_info)
 
+    tokens = TokenLookup.preload(default_context, ["ETH", "BTC", "USDT"])
     balances_before = [
-        TokenValue(TokenLookup.find_by_name(default_context, "ETH"), Decimal(1)),
-        TokenValue(TokenLookup.find_by_name(default_context, "BTC"), Decimal("0.1")),
-        TokenValue(TokenLookup.find_by_name(default_context, "USDT"), Decimal(1000))
+        TokenValue(tokens["ETH"], _D_ONE),
+        TokenValue(tokens["BTC"], _D_POINT_ONE),
+        TokenValue(tokens["USDT"], _D_THOUSAND)
     ]
     balances_after = [
-        TokenValue(TokenLookup.find_by_name(default_context, "ETH"), Decimal(1)),
-        TokenValue(TokenLookup.find_by_name(default_context, "BTC"), Decimal("0.05")),
-        TokenValue(TokenLookup.find_by_name(default_context, "USDT"), Decimal(2000))
+        TokenValue(tokens["ETH"], _D_ONE),
+        TokenValue(tokens["BTC"], _D_POINT_ZERO_FIVE),
+        TokenValue(tokens["USDT"], _D_TWO_THOUSAND)
     ]
     timestamp = datetime.datetime(2021, 5, 17, 12, 20, 56)
     event = LiquidationEvent(timestamp, "signature", SYSTEM_PROGRAM_ADDRESS, SYSTEM_PROGRAM_ADDRESS,
                              balances_before, balances_after)
-    print(event)
\ No newline at end of file
+    print(event)
+    TokenValue.report(print, LiquidationEvent.aggregate_changes([event, event]))
\ No newline at end of file
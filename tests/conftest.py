@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The modules live at the top of the repository rather than in a package, so make them importable.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
@@ -0,0 +1,50 @@
+import types
+
+import pytest
+
+from decimal import Decimal
+
+from baseCli import Group
+from Constants import MAX_RATE, OPTIMAL_RATE, OPTIMAL_UTIL, RATE_SLOPE_HIGH, RATE_SLOPE_LOW
+
+
+def _group(total_deposits: Decimal, total_borrows: Decimal, deposit_index: Decimal = Decimal(1), borrow_index: Decimal = Decimal(1)) -> Group:
+    # Only the totals and the token's index are needed for rates, so skip loading a real Group.
+    group = Group.__new__(Group)
+    group.total_deposits = [total_deposits]
+    group.total_borrows = [total_borrows]
+    group.basket_tokens = [types.SimpleNamespace(index=types.SimpleNamespace(deposit=deposit_index, borrow=borrow_index))]
+    return group
+
+
+def test_ui_totals_apply_the_token_index():
+    group = _group(Decimal(1000), Decimal(400), deposit_index=Decimal("0.000002"), borrow_index=Decimal("0.000003"))
+
+    assert group.get_ui_total_deposit(0) == Decimal("0.002")
+    assert group.get_ui_total_borrow(0) == Decimal("0.0012")
+
+
+def test_rates_are_zero_with_no_deposits_or_borrows():
+    group = _group(Decimal(0), Decimal(0))
+
+    assert group.get_borrow_rate(0) == 0.0
+    assert group.get_deposit_rate(0) == 0.0
+
+
+def test_borrow_rate_is_max_when_fully_utilised():
+    assert _group(Decimal(0), Decimal(10)).get_borrow_rate(0) == MAX_RATE
+    assert _group(Decimal(10), Decimal(10)).get_borrow_rate(0) == MAX_RATE
+
+
+def test_borrow_rate_below_optimal_utilisation():
+    assert _group(Decimal(100), Decimal(50)).get_borrow_rate(0) == pytest.approx(RATE_SLOPE_LOW * 0.5)
+
+
+def test_borrow_rate_above_optimal_utilisation():
+    assert _group(Decimal(100), Decimal(90)).get_borrow_rate(0) == pytest.approx(OPTIMAL_RATE + RATE_SLOPE_HIGH * (0.9 - OPTIMAL_UTIL))
+
+
+def test_deposit_rate_is_borrow_rate_scaled_by_utilisation():
+    group = _group(Decimal(100), Decimal(50))
+
+    assert group.get_deposit_rate(0) == pytest.approx(0.5 * group.get_borrow_rate(0))
@@ -0,0 +1,64 @@
+import random
+import re
+import struct
+import typing
+
+import Layout as layouts
+
+# The struct-based parsers in Layout.py have to produce the same Containers as the construct
+# layouts they stand in for. Each test packs the same deterministic values into a buffer with the
+# fast format and parses it both ways.
+
+
+def _buffer_for(format: struct.Struct, seed: int, overrides: typing.Optional[typing.Dict[int, typing.Any]] = None) -> bytes:
+    # 64-bit values are kept well inside the range datetime.fromtimestamp() accepts, since some of
+    # them are timestamps. 128-bit values are made from two of these, so both halves are non-zero.
+    generator = random.Random(seed)
+    values: typing.List[typing.Any] = []
+    for count, code in re.findall(r"(\d*)([xsBQ])", format.format):
+        repeat = int(count) if count else 1
+        if code == "s":
+            values.append(bytes(generator.getrandbits(8) for _ in range(repeat)))
+        elif code == "B":
+            values.extend(generator.randrange(256) for _ in range(repeat))
+        elif code == "Q":
+            values.extend(generator.randrange(2 ** 31) for _ in range(repeat))
+    for index, value in (overrides or {}).items():
+        values[index] = value
+    return format.pack(*values)
+
+
+def test_parse_group_matches_construct_layout():
+    assert layouts._GROUP_FORMAT_MATCHES
+    data = _buffer_for(layouts._GROUP_FORMAT, 1)
+
+    assert layouts.parse_group(data) == layouts.GROUP.parse(data)
+
+
+def test_parse_margin_account_matches_construct_layout():
+    assert layouts._MARGIN_ACCOUNT_FORMAT_MATCHES
+    data = _buffer_for(layouts._MARGIN_ACCOUNT_FORMAT, 2)
+
+    assert layouts.parse_margin_account(data) == layouts.MARGIN_ACCOUNT.parse(data)
+
+
+def test_parse_open_orders_matches_construct_layout():
+    assert layouts._OPEN_ORDERS_FORMAT_MATCHES
+    data = _buffer_for(layouts._OPEN_ORDERS_FORMAT, 3)
+
+    assert layouts.parse_open_orders(data) == layouts.OPEN_ORDERS.parse(data)
+
+
+def test_parse_aggregator_matches_construct_layout():
+    assert layouts._AGGREGATOR_FORMAT_MATCHES
+    # The description is a null-padded UTF-8 string, so it can't be random bytes.
+    data = _buffer_for(layouts._AGGREGATOR_FORMAT, 4, {0: b"ETH/USDT".ljust(32, b"\x00")})
+
+    assert layouts.parse_aggregator(data) == layouts.AGGREGATOR.parse(data)
+
+
+def test_parse_token_account_matches_construct_layout():
+    assert layouts._TOKEN_ACCOUNT_FORMAT_MATCHES
+    data = _buffer_for(layouts._TOKEN_ACCOUNT_FORMAT, 5)
+
+    assert layouts.parse_token_account(data) == layouts.TOKEN_ACCOUNT.parse(data)
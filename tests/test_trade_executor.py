@@ -0,0 +1,69 @@
+import types
+import typing
+
+from decimal import Decimal
+from unittest import mock
+
+from solana.publickey import PublicKey
+from solana.transaction import TransactionInstruction
+
+from baseCli import OpenOrders, TokenAccount
+from TradeExecutor import SerumImmediateTradeExecutor
+
+MARKET_ADDRESS = PublicKey(1)
+OWNER_ADDRESS = PublicKey(2)
+DEX_PROGRAM_ID = PublicKey(3)
+OPEN_ORDERS_ADDRESS = PublicKey(4)
+
+
+def _fake_open_orders(base_token_free: Decimal, quote_token_free: Decimal) -> types.SimpleNamespace:
+    return types.SimpleNamespace(address=OPEN_ORDERS_ADDRESS, base_token_free=base_token_free,
+                                 quote_token_free=quote_token_free, to_pyserum=lambda: None)
+
+
+def _settle(monkeypatch, open_orders: typing.List[types.SimpleNamespace]):
+    context = mock.MagicMock()
+    context.dex_program_id = DEX_PROGRAM_ID
+    context.encoding = "base64"
+    context.client.get_program_accounts.return_value = {"result": [
+        {"pubkey": str(OPEN_ORDERS_ADDRESS), "account": {"executable": False, "lamports": 1, "owner": str(DEX_PROGRAM_ID), "rentEpoch": 0, "data": ["", "base64"]}}
+        for _ in open_orders
+    ]}
+    context.send_multiple_transactions.side_effect = lambda transactions, *signers: [{"result": f"signature-{index}"} for index in range(len(transactions))]
+    context.unwrap_transaction_id_or_raise_exception.side_effect = lambda response: response["result"]
+
+    parsed = iter(open_orders)
+    monkeypatch.setattr(OpenOrders, "parse", staticmethod(lambda account_info, base_decimals, quote_decimals: next(parsed)))
+    monkeypatch.setattr(TokenAccount, "find_largest_or_create", staticmethod(lambda context, account, token, token_accounts: types.SimpleNamespace(address=PublicKey(5))))
+    monkeypatch.setattr(PublicKey, "create_program_address", staticmethod(lambda seeds, program_id: PublicKey(6)))
+
+    wallet = types.SimpleNamespace(address=OWNER_ADDRESS, account=mock.MagicMock())
+    wallet.account.public_key.return_value = OWNER_ADDRESS
+    token = types.SimpleNamespace(mint=PublicKey(7), decimals=Decimal(6))
+    market_metadata = types.SimpleNamespace(address=MARKET_ADDRESS, base=types.SimpleNamespace(token=token),
+                                            quote=types.SimpleNamespace(token=token))
+    market = mock.MagicMock()
+    market.state.public_key.return_value = MARKET_ADDRESS
+    market.state.vault_signer_nonce.return_value = 0
+    market.make_settle_funds_instruction.return_value = TransactionInstruction(keys=[], program_id=DEX_PROGRAM_ID, data=b"")
+
+    executor = SerumImmediateTradeExecutor(context, wallet, mock.MagicMock(), order_book_cache=mock.MagicMock())
+    return context, executor.settle(market_metadata, market, {})
+
+
+def test_settle_sends_one_batch_for_open_orders_with_free_tokens(monkeypatch):
+    context, transaction_ids = _settle(monkeypatch, [_fake_open_orders(Decimal(1), Decimal(0)),
+                                                     _fake_open_orders(Decimal(0), Decimal(0)),
+                                                     _fake_open_orders(Decimal(0), Decimal(2))])
+
+    assert transaction_ids == ["signature-0", "signature-1"]
+    assert context.send_multiple_transactions.call_count == 1
+    assert len(context.send_multiple_transactions.call_args[0][0]) == 2
+    assert context.client.get_program_accounts.call_args[0][0] == DEX_PROGRAM_ID
+
+
+def test_settle_sends_nothing_when_no_tokens_are_free(monkeypatch):
+    context, transaction_ids = _settle(monkeypatch, [_fake_open_orders(Decimal(0), Decimal(0))])
+
+    assert transaction_ids == []
+    assert context.send_multiple_transactions.call_args[0][0] == []